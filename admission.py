@@ -0,0 +1,119 @@
+import math
+import threading
+from collections import deque
+from time import monotonic
+
+from resilience import CANCEL_POLL_SECONDS, LatencyTracker
+
+
+class Overloaded(Exception):
+    """The request was shed because the server cannot answer it in time"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Global concurrency limit with a bounded FIFO wait queue
+
+    At most limit requests run at once and at most queue_size wait for a
+    slot. A request is shed straight away when the queue is full or when the
+    expected wait (queue position times the recent average time a slot is
+    held) is longer than its remaining deadline, and later if its deadline
+    runs out while still queued. A queued request whose deadline is
+    cancelled (its client went away) leaves the queue at once. Shed requests
+    get a Retry-After estimate of how long the current backlog needs to drain.
+    """
+
+    def __init__(self, limit=16, queue_size=32, max_wait=10.0, smoothing=0.2):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait  # used for requests without a deadline
+        self.smoothing = smoothing
+        self._active = 0
+        self._waiting = deque()
+        self._service_time = None  # moving average of seconds a slot is held
+        self._queue_time = LatencyTracker()
+        self._cond = threading.Condition()
+        self.admitted = 0
+        self.shed = {'queue_full': 0, 'predicted_wait': 0, 'timed_out': 0, 'cancelled': 0}
+
+    def _expected_wait(self, position):
+        """Seconds until the request at this queue position gets a slot, going by recent slot times"""
+        if self._service_time is None:
+            return 0.0
+        return (position + 1) / self.limit * self._service_time
+
+    def _reject(self, reason, message):
+        self.shed[reason] += 1
+        retry_after = max(1, math.ceil(self._expected_wait(len(self._waiting))))
+        raise Overloaded(message, retry_after)
+
+    def acquire(self, deadline=None):
+        """Wait for a slot and return a function that gives it back; raises Overloaded"""
+        started = monotonic()
+        give_up_at = started + (deadline.remaining() if deadline is not None else self.max_wait)
+        with self._cond:
+            if self._active >= self.limit or self._waiting:
+                if len(self._waiting) >= self.queue_size:
+                    self._reject('queue_full', "Server is busy, please retry shortly")
+                if self._expected_wait(len(self._waiting)) > give_up_at - started:
+                    self._reject('predicted_wait', "Server is busy, please retry shortly")
+                ticket = object()
+                self._waiting.append(ticket)
+                try:
+                    while self._waiting[0] is not ticket or self._active >= self.limit:
+                        remaining = give_up_at - monotonic()
+                        if deadline is not None and deadline.cancelled():
+                            self._waiting.remove(ticket)
+                            self._cond.notify_all()
+                            self._reject('cancelled', f"Request cancelled: {deadline.cancel_reason}")
+                        if remaining <= 0:
+                            self._waiting.remove(ticket)
+                            self._cond.notify_all()
+                            self._reject('timed_out', "Server is busy, please retry shortly")
+                        self._cond.wait(min(remaining, CANCEL_POLL_SECONDS) if deadline is not None else remaining)
+                except Overloaded:
+                    raise
+                except BaseException:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+                    raise
+                self._waiting.popleft()
+                # The next in line may fit too if several slots were freed at once
+                self._cond.notify_all()
+            self._active += 1
+            self.admitted += 1
+        admitted_at = monotonic()
+        self._queue_time.record(admitted_at - started)
+
+        released = []
+
+        def release():
+            if released:
+                return
+            released.append(True)
+            held = monotonic() - admitted_at
+            with self._cond:
+                self._active -= 1
+                self._service_time = held if self._service_time is None else \
+                    self._service_time + self.smoothing * (held - self._service_time)
+                self._cond.notify_all()
+
+        return release
+
+    def stats(self):
+        with self._cond:
+            stats = {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'active': self._active,
+                'queued': len(self._waiting),
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'avg_service_ms': round(self._service_time * 1000, 1) if self._service_time is not None else None,
+            }
+        p95 = self._queue_time.percentile(0.95)
+        stats['queue_wait_p95_ms'] = round(p95 * 1000, 1) if p95 is not None else None
+        return stats
@@ -1,18 +1,133 @@
-from flask import Flask, request, render_template_string, send_file
-from deep_translator import GoogleTranslator
+from flask import Flask, Response, g, request, render_template, send_file, stream_with_context, url_for
+from jinja2 import DictLoader
+from werkzeug.wsgi import ClosingIterator
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import wraps
 from time import time
+import contextvars
+import io
 import json
 import os
-import tempfile
-from gtts import gTTS
+import threading
+from admission import AdmissionController, Overloaded
+from disconnect import DisconnectWatcher
+from jobs import JobManager, progress
+from languages import DEFAULT_LANGUAGES, LanguageCatalog, fetch_languages
+from live import LiveSession
+from packing import MAX_REQUEST_CHARS
+from resilience import Cancelled, clear_deadline, current_deadline, start_deadline
+from scheduler import priority, set_priority
+from service import SpeechService, TranslationService, env_setting, import_backends, resilience_from_env
+from subtitles import SUBTITLE_FORMATS, cue_windows, parse_subtitles, translate_window
 
 app = Flask(__name__)
 
+# Cleanup that has to wait until the server has sent the whole response, such
+# as giving back an admission slot. Flask's teardown runs before a streamed
+# body is generated, and send_file() responses never call their close hooks,
+# so these run from the WSGI iterable's close() instead, which servers always call.
+def on_response_close(callback):
+    request.environ.setdefault('translator.on_close', []).append(callback)
+
+def _run_close_callbacks(environ):
+    callbacks = environ.pop('translator.on_close', [])
+    for callback in reversed(callbacks):
+        try:
+            callback()
+        except Exception as e:
+            app.logger.error(f"Response close callback failed: {str(e)}")
+
+def close_callbacks_middleware(wsgi_app):
+    @wraps(wsgi_app)
+    def wrapped(environ, start_response):
+        try:
+            iterable = wsgi_app(environ, start_response)
+        except BaseException:
+            # Nothing will be sent; the gunicorn WebSocket handler ends this way too
+            _run_close_callbacks(environ)
+            raise
+        return ClosingIterator(iterable, lambda: _run_close_callbacks(environ))
+    return wrapped
+
+app.wsgi_app = close_callbacks_middleware(app.wsgi_app)
+
+# WebSocket support for live translation is optional (pip install flask-sock)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+sock = Sock(app) if Sock is not None else None
+
 # Store translation history (last 10 translations)
 translation_history = deque(maxlen=10)
 
+# Deadlines, circuit breakers, optional hedging and priority scheduling around
+# every upstream call. Translation and speech are separate bulkheads: each has
+# its own upstream pool, scheduler slots and circuit breakers, so a slow TTS
+# backend cannot take capacity from translations or the other way round.
+# Settings prefixed with SPEECH_ override the shared ones for speech only.
+REQUEST_BUDGET_SECONDS = float(os.environ.get('REQUEST_BUDGET_SECONDS', '10'))
+resilience = resilience_from_env()
+speech_resilience = resilience_from_env('SPEECH_')
+
+# Threads do not survive fork(). Under the pre-forking server (gunicorn.conf.py)
+# DEFER_BACKGROUND_THREADS=1 holds them back and each worker starts its own.
+DEFER_BACKGROUND_THREADS = os.environ.get('DEFER_BACKGROUND_THREADS') == '1'
+
+# Translation memory, packing, placeholders and provider routing (see service.py)
+translator = TranslationService.from_env(resilience)
+
+# Supported translation and speech languages from an on-disk snapshot that is
+# refreshed in the background; requests are validated against it up front
+languages = LanguageCatalog(
+    os.environ.get('LANGUAGES_SNAPSHOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'languages.json')),
+    lambda: fetch_languages(translator.router.providers),
+    refresh_seconds=float(os.environ.get('LANGUAGES_REFRESH_SECONDS', '86400')),
+    start=not DEFER_BACKGROUND_THREADS,
+)
+
+# Cached, optionally speculative text-to-speech
+speech_service = SpeechService.from_env(speech_resilience, start=not DEFER_BACKGROUND_THREADS)
+
+# Provider libraries are imported on first use. Load them in the background so
+# the server is up at once and the first translation does not wait for them.
+if not DEFER_BACKGROUND_THREADS:
+    threading.Thread(target=import_backends, name='import-backends', daemon=True).start()
+
+# Cancels a request's pending upstream work when its client goes away
+disconnect_watcher = DisconnectWatcher()
+
+@app.before_request
+def start_request_budget():
+    g.deadline = start_deadline(REQUEST_BUDGET_SECONDS)
+    # Someone is waiting for the answer; bulk routes lower this themselves
+    set_priority('interactive')
+    client = request.environ.get('werkzeug.socket') or request.environ.get('gunicorn.socket')
+    watch = disconnect_watcher.watch(client, g.deadline) if client is not None else None
+    # Not a teardown_request hook: streamed bodies are generated after teardown,
+    # and a client leaving mid-stream must still cancel the rest of the work
+    on_response_close(lambda: end_request_budget(watch))
+
+def end_request_budget(watch):
+    if watch is not None:
+        disconnect_watcher.unwatch(watch)
+    clear_deadline()
+
+# Admission control in front of the routes that call upstream: a concurrency
+# limit plus a short wait queue per bulkhead, shedding the excess with 503
+def admission_from_env(prefix=''):
+    return AdmissionController(
+        limit=int(env_setting('ADMISSION_CONCURRENCY', '16', prefix)),
+        queue_size=int(env_setting('ADMISSION_QUEUE', '32', prefix)),
+        max_wait=REQUEST_BUDGET_SECONDS,
+    )
+
+admission = {'translate': admission_from_env(), 'speech': admission_from_env('SPEECH_')}
+
+# Fan-out translations run concurrently, one worker per target language
+fanout_executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix='fanout')
+
 # Custom Jinja2 filter for escaping JavaScript strings
 @app.template_filter('tojson_safe')
 def tojson_safe(s):
@@ -43,54 +158,84 @@ def rate_limit(limit=10, per=60):
         return wrapped
     return decorator
 
-# Language to gTTS language code mapping
-GTTs_LANGUAGE_MAP = {
-    'ta': 'ta',  # Tamil
-    'en': 'en',  # English
-    'hi': 'hi',  # Hindi
-    'fr': 'fr',  # French
-    'de': 'de',  # German
-    'es': 'es',  # Spanish
-    'zh-CN': 'zh-CN',  # Chinese
-    'ja': 'ja',  # Japanese
-    'ko': 'ko',  # Korean
-    'ru': 'ru',  # Russian
-    'ar': 'ar',  # Arabic
-    'it': 'it'   # Italian
-}
+# Admission control decorator; methods limits it to e.g. POST on routes that also serve pages
+def admission_control(bulkhead='translate', methods=None):
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            if methods is not None and request.method not in methods:
+                return f(*args, **kwargs)
+            try:
+                release = admission[bulkhead].acquire(g.deadline)
+            except Overloaded as e:
+                return "Server is busy. Please retry shortly.", 503, {'Retry-After': str(e.retry_after)}
+            # Streamed responses hold their slot until the last chunk is sent
+            on_response_close(release)
+            return f(*args, **kwargs)
+        return wrapped
+    return decorator
 
 @app.route('/speak/<lang>/<path:text>')
+@admission_control('speech')
 def speak(text, lang):
     """Generate speech using gTTS and return as audio file"""
-    temp_path = None
+    if not languages.supports_speech(lang):
+        return f"Speech is not available for language '{lang}'", 400
     try:
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_path = temp_file.name
-        temp_file.close()
-        
-        # Get language code for gTTS
-        lang_code = GTTs_LANGUAGE_MAP.get(lang, 'en')
-        print(f"Generating speech for language: {lang_code}, text: {text[:50]}...")  # Debug log
-        
-        # Generate speech using gTTS
-        tts = gTTS(text=text, lang=lang_code, slow=False)
-        tts.save(temp_path)
+        print(f"Generating speech for language: {lang}, text: {text[:50]}...")  # Debug log
         
-        # Send the file
-        return send_file(temp_path, mimetype='audio/mpeg', as_attachment=False, download_name=f'speech_{lang}.mp3')
+        data = speech_service.synthesize(text, lang)
+        return send_file(io.BytesIO(data), mimetype='audio/mpeg', as_attachment=False, download_name=f'speech_{lang}.mp3')
         
     except Exception as e:
         app.logger.error(f"gTTS error: {str(e)}")
         print(f"gTTS error details: {str(e)}")  # Debug log
         return f"Error generating speech: {str(e)}", 500
-    finally:
-        # Clean up temp file after sending (with a small delay to ensure file is sent)
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.unlink(temp_path)
-            except Exception as e:
-                app.logger.error(f"Error deleting temp file: {str(e)}")
+
+@app.route('/api/speech', methods=['POST'])
+def create_speech():
+    """Return a content-addressed audio ID for text, without putting the text in a URL"""
+    payload = request.get_json(silent=True) or {}
+    text = payload.get('text')
+    lang = payload.get('lang', 'en')
+
+    if not isinstance(text, str) or not text.strip():
+        return {'error': 'Please provide some text to speak'}, 400
+    if len(text) > MAX_REQUEST_CHARS:
+        return {'error': f"Text exceeds maximum length of {MAX_REQUEST_CHARS} characters"}, 400
+    if not languages.supports_speech(lang):
+        return {'error': f"Speech is not available for language '{lang}'"}, 400
+
+    speech_id = speech_service.register(text, lang)
+    return {'id': speech_id, 'url': url_for('speech_audio', speech_id=speech_id)}
+
+@app.route('/api/speech/<speech_id>')
+@admission_control('speech')
+def speech_audio(speech_id):
+    """Serve audio by ID; the bytes never change, so browsers and proxies may keep them forever"""
+    if speech_id in request.if_none_match:
+        response = Response(status=304)
+    else:
+        try:
+            data = speech_service.audio(speech_id)
+        except Cancelled as e:
+            app.logger.info(f"Speech abandoned: {str(e)}")
+            return str(e), 503
+        except Exception as e:
+            app.logger.error(f"gTTS error: {str(e)}")
+            return f"Error generating speech: {str(e)}", 500
+        if data is None:
+            return "Audio not found", 404
+        response = Response(data, mimetype='audio/mpeg')
+
+    response.set_etag(speech_id)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    if response.status_code == 304:
+        return response
+    # Handles If-None-Match as well as Range requests for seeking (206 Partial Content)
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
 
 HTML_PAGE = """
 <!DOCTYPE html>
@@ -408,6 +553,21 @@ HTML_PAGE = """
             transform: none;
         }
 
+        .live-toggle {
+            display: block;
+            text-align: center;
+            margin-top: 15px;
+            font-size: 12px;
+            letter-spacing: 1px;
+            color: var(--text-secondary);
+            cursor: pointer;
+        }
+
+        .live-toggle input {
+            accent-color: var(--primary);
+            margin-right: 6px;
+        }
+
         /* Voice status indicator and controls */
         .voice-status-container {
             background: rgba(0, 0, 0, 0.3);
@@ -938,18 +1098,9 @@ HTML_PAGE = """
                         <label>SOURCE LANGUAGE</label>
                         <select name="source" class="neon-select" id="sourceLang">
                             <option value="auto">🔍 AUTO DETECT</option>
-                            <option value="en">🇬🇧 ENGLISH</option>
-                            <option value="ta">🇮🇳 TAMIL</option>
-                            <option value="hi">🇮🇳 HINDI</option>
-                            <option value="fr">🇫🇷 FRENCH</option>
-                            <option value="de">🇩🇪 GERMAN</option>
-                            <option value="es">🇪🇸 SPANISH</option>
-                            <option value="zh-CN">🇨🇳 CHINESE</option>
-                            <option value="ja">🇯🇵 JAPANESE</option>
-                            <option value="ko">🇰🇷 KOREAN</option>
-                            <option value="ru">🇷🇺 RUSSIAN</option>
-                            <option value="ar">🇸🇦 ARABIC</option>
-                            <option value="it">🇮🇹 ITALIAN</option>
+                            {% for code, label in language_options %}
+                            <option value="{{ code }}">{{ label }}</option>
+                            {% endfor %}
                         </select>
                     </div>
 
@@ -960,18 +1111,21 @@ HTML_PAGE = """
                     <div class="lang-selector">
                         <label>TARGET LANGUAGE</label>
                         <select name="target" class="neon-select" id="targetLang" onchange="checkVoiceAvailability()">
-                            <option value="en">🇬🇧 ENGLISH</option>
-                            <option value="ta">🇮🇳 TAMIL</option>
-                            <option value="hi">🇮🇳 HINDI</option>
-                            <option value="fr">🇫🇷 FRENCH</option>
-                            <option value="de">🇩🇪 GERMAN</option>
-                            <option value="es">🇪🇸 SPANISH</option>
-                            <option value="zh-CN">🇨🇳 CHINESE</option>
-                            <option value="ja">🇯🇵 JAPANESE</option>
-                            <option value="ko">🇰🇷 KOREAN</option>
-                            <option value="ru">🇷🇺 RUSSIAN</option>
-                            <option value="ar">🇸🇦 ARABIC</option>
-                            <option value="it">🇮🇹 ITALIAN</option>
+                            {% for code, label in language_options %}
+                            <option value="{{ code }}"{% if code == target_lang %} selected{% endif %}>{{ label }}</option>
+                            {% endfor %}
+                        </select>
+                    </div>
+                </div>
+
+                <div class="language-row">
+                    <div class="lang-selector">
+                        <label>INPUT FORMAT</label>
+                        <select name="format" class="neon-select" id="inputFormat">
+                            <option value="">🔍 AUTO (TEXT OR HTML)</option>
+                            {% for value, label in (('text', '📝 PLAIN TEXT'), ('html', '🌐 HTML'), ('markdown', '📄 MARKDOWN')) %}
+                            <option value="{{ value }}"{% if value == input_format %} selected{% endif %}>{{ label }}</option>
+                            {% endfor %}
                         </select>
                     </div>
                 </div>
@@ -979,6 +1133,11 @@ HTML_PAGE = """
                 <button type="submit" class="translate-button">
                     <span>⟳ TRANSLATE</span>
                 </button>
+                {% if live_enabled %}
+                <label class="live-toggle">
+                    <input type="checkbox" id="liveToggle">⚡ LIVE TRANSLATE AS YOU TYPE
+                </label>
+                {% endif %}
             </form>
 
             <!-- Voice Status Panel -->
@@ -1000,8 +1159,7 @@ HTML_PAGE = """
                 </div>
             </div>
 
-            {% if result %}
-            <div class="result-container">
+            <div class="result-container" id="resultPanel"{% if not result %} style="display: none;"{% endif %}>
                 <div class="result-header">
                     <div class="result-label">TRANSLATION RESULT</div>
                     <div class="voice-controls">
@@ -1023,22 +1181,18 @@ HTML_PAGE = """
                     <span id="statusText">Voice ready</span>
                 </div>
             </div>
-            {% endif %}
 
-            {% if error %}
-            <div class="error-message">
-                ⚠️ {{ error }}
+            <div class="error-message" id="errorMessage"{% if not error %} style="display: none;"{% endif %}>
+                ⚠️ <span id="errorText">{{ error or '' }}</span>
             </div>
-            {% endif %}
         </div>
 
-        {% if history %}
-        <div class="history-section">
+        <div class="history-section" id="historySection"{% if not history %} style="display: none;"{% endif %}>
             <div class="history-title">
                 <span>📜 RECENT TRANSLATIONS</span>
-                <span class="neon-text">({{ history|length }}/10)</span>
+                <span class="neon-text" id="historyCount">({{ history|length }}/10)</span>
             </div>
-            <div class="history-grid">
+            <div class="history-grid" id="historyGrid">
                 {% for item in history %}
                 <div class="history-item">
                     <div class="history-langs">
@@ -1053,7 +1207,6 @@ HTML_PAGE = """
                 {% endfor %}
             </div>
         </div>
-        {% endif %}
 
         <div class="footer">
             <span class="neon-text">PRIME TRANSLATE ENGINE</span> • NEURAL NETWORK v1.0 • 5 REQ/MIN • CLOUD VOICE ENABLED
@@ -1071,6 +1224,11 @@ HTML_PAGE = """
         let useCloudVoice = true; // Start with cloud voice enabled
         const audioPlayer = document.getElementById('cloudAudio');
 
+        // Audio the server already started generating for this result (if enabled)
+        let preparedAudioId = {{ audio_id|tojson_safe|safe }};
+        let preparedAudioLang = {{ target_lang|tojson_safe|safe }};
+        const speechLanguages = new Set({{ speech_languages|tojson }});
+
         // Language codes for speech with multiple fallback options
         const languageMap = {
             'en': ['en-US', 'en-GB', 'en-AU', 'en-IN', 'en'],
@@ -1179,6 +1337,15 @@ HTML_PAGE = """
                 updateVoiceStatus('☁️ Cloud voice active', 'cloud');
                 useCloudVoice = true;
             }
+            else if (!speechLanguages.has(targetLang)) {
+                voiceBadge.textContent = '✕ NO VOICE';
+                voiceBadge.className = 'voice-badge';
+                voiceMessage.textContent = `No voice is available for ${targetLang.toUpperCase()}`;
+                if (testBtn) testBtn.disabled = true;
+                if (playBtn) playBtn.disabled = true;
+                updateVoiceStatus('✕ No voice for this language');
+                useCloudVoice = false;
+            }
             else if (voiceAvailability[targetLang] && voiceAvailability[targetLang].available) {
                 voiceBadge.textContent = '✓ VOICE AVAILABLE';
                 voiceBadge.className = 'voice-badge available';
@@ -1247,13 +1414,38 @@ HTML_PAGE = """
             return null;
         }
 
+        // Audio IDs already handed out by the server, keyed by language and text
+        const speechIds = {};
+
+        // Get a content-addressed audio URL, so replays are served from the browser cache
+        async function getSpeechUrl(text, langCode) {
+            const key = langCode + '\\n' + text;
+            if (!speechIds[key]) {
+                const response = await fetch('/api/speech', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ text: text, lang: langCode })
+                });
+                if (!response.ok) {
+                    throw new Error(`Speech request failed (${response.status})`);
+                }
+                speechIds[key] = (await response.json()).id;
+            }
+            return `/api/speech/${speechIds[key]}`;
+        }
+
         // Speak text using cloud API
         async function speakCloud(text, langCode, isTest = false) {
+            const legacyUrl = `/speak/${langCode}/${encodeURIComponent(text)}`;
+            let url;
+            try {
+                url = await getSpeechUrl(text, langCode);
+            } catch (e) {
+                console.error('Speech API error, using legacy URL:', e);
+                url = legacyUrl;
+            }
+
             return new Promise((resolve, reject) => {
-                // Encode the text for URL
-                const encodedText = encodeURIComponent(text);
-                const url = `/speak/${langCode}/${encodedText}`;
-                
                 console.log('Attempting cloud speech with URL:', url); // Debug log
                 
                 // Show loading state
@@ -1309,6 +1501,15 @@ HTML_PAGE = """
                 };
                 
                 audioPlayer.onerror = (e) => {
+                    if (url !== legacyUrl) {
+                        // Forget the audio ID so replays ask again, and try the direct URL once
+                        console.error('Audio ID failed, using legacy URL:', e);
+                        delete speechIds[langCode + '\\n' + text];
+                        url = legacyUrl;
+                        audioPlayer.src = url;
+                        audioPlayer.load();
+                        return;
+                    }
                     console.error('Audio error:', e);
                     showNotification('Cloud voice error', '❌');
                     reject(e);
@@ -1613,10 +1814,195 @@ HTML_PAGE = """
             }
         }
 
+        // Translate through the JSON API and update the result and history in place
+        let translateController = null;
+
+        function showError(message) {
+            document.getElementById('errorText').textContent = message;
+            document.getElementById('errorMessage').style.display = '';
+        }
+
+        function showResult(data) {
+            if (!audioPlayer.paused || synthesis.speaking) {
+                stopSpeech();
+            }
+            document.getElementById('errorMessage').style.display = 'none';
+            document.getElementById('translatedText').textContent = data.translation;
+            document.getElementById('targetLangDisplay').textContent = data.target.toUpperCase();
+            document.getElementById('resultPanel').style.display = '';
+
+            preparedAudioId = data.audio_id;
+            preparedAudioLang = data.target;
+            if (preparedAudioId) {
+                speechIds[preparedAudioLang + '\\n' + data.translation] = preparedAudioId;
+            }
+            checkVoiceAvailability();
+        }
+
+        function renderHistory(history) {
+            const grid = document.getElementById('historyGrid');
+            grid.replaceChildren(...history.map(item => {
+                const el = document.createElement('div');
+                el.className = 'history-item';
+                el.innerHTML = `
+                    <div class="history-langs">
+                        <span></span>
+                        <button class="history-voice-btn" title="Listen to translation">🔊</button>
+                    </div>
+                    <div class="history-original"></div>
+                    <div class="history-translated"></div>`;
+                el.querySelector('span').textContent = `${item.source.toUpperCase()} → ${item.target.toUpperCase()}`;
+                el.querySelector('.history-original').textContent = item.original;
+                el.querySelector('.history-translated').textContent = item.translated;
+                const button = el.querySelector('button');
+                button.onclick = () => speakHistory(item.translated, item.target, button);
+                addHistoryHover(el);
+                return el;
+            }));
+            document.getElementById('historyCount').textContent = `(${history.length}/10)`;
+            document.getElementById('historySection').style.display = history.length ? '' : 'none';
+        }
+
+        async function translateInPlace() {
+            // A newer submission supersedes whatever is still in flight
+            if (translateController) {
+                translateController.abort();
+            }
+            const controller = new AbortController();
+            translateController = controller;
+
+            const loader = document.getElementById('loader');
+            const button = document.querySelector('.translate-button');
+            loader.style.display = 'block';
+            button.style.opacity = '0.7';
+
+            try {
+                const response = await fetch('/api/translate', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        text: document.getElementById('textInput').value,
+                        source: document.getElementById('sourceLang').value,
+                        target: document.getElementById('targetLang').value,
+                        // Empty means auto-detect, which only recognizes unmistakable HTML
+                        format: document.getElementById('inputFormat').value || undefined
+                    }),
+                    signal: controller.signal
+                });
+                const isJson = (response.headers.get('Content-Type') || '').includes('application/json');
+                const data = isJson ? await response.json() : { error: await response.text() };
+
+                if (!response.ok || data.error) {
+                    showError(data.error || `Request failed (${response.status})`);
+                } else {
+                    showResult(data);
+                    renderHistory(data.history);
+                }
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    showError('Translation failed: ' + error.message);
+                }
+            } finally {
+                if (translateController === controller) {
+                    translateController = null;
+                    loader.style.display = 'none';
+                    button.style.opacity = '';
+                }
+            }
+        }
+
+        // Live translate-as-you-type over WebSocket
+        let liveSocket = null;
+        let liveSentText = [];
+        let liveSentences = [];
+
+        function sendLiveConfig() {
+            if (liveSocket && liveSocket.readyState === WebSocket.OPEN) {
+                liveSocket.send(JSON.stringify({
+                    type: 'config',
+                    source: document.getElementById('sourceLang').value,
+                    target: document.getElementById('targetLang').value
+                }));
+            }
+        }
+
+        // Send only the span that changed since the last message (code points, to match the server)
+        function sendLiveEdit() {
+            if (!liveSocket || liveSocket.readyState !== WebSocket.OPEN) return;
+            const text = Array.from(textarea.value);
+            const old = liveSentText;
+            let start = 0;
+            while (start < text.length && start < old.length && text[start] === old[start]) start++;
+            let end = 0;
+            while (end < text.length - start && end < old.length - start &&
+                   text[text.length - 1 - end] === old[old.length - 1 - end]) end++;
+
+            const removed = old.length - start - end;
+            const inserted = text.slice(start, text.length - end).join('');
+            if (removed === 0 && inserted === '') return;
+            liveSocket.send(JSON.stringify({ type: 'edit', pos: start, delete: removed, insert: inserted }));
+            liveSentText = text;
+        }
+
+        function startLive() {
+            const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+            liveSocket = new WebSocket(`${protocol}//${location.host}/ws/translate`);
+            liveSentText = [];
+            liveSentences = [];
+
+            liveSocket.onopen = () => {
+                sendLiveConfig();
+                sendLiveEdit();
+                showNotification('Live translation on', '⚡');
+            };
+            liveSocket.onmessage = (event) => {
+                const message = JSON.parse(event.data);
+                if (message.type === 'error') {
+                    showError(message.message);
+                    return;
+                }
+                liveSentences.length = message.length;
+                message.ops.forEach(op => { liveSentences[op.index] = op.text; });
+                if (message.length) {
+                    showResult({
+                        translation: liveSentences.join(' '),
+                        target: document.getElementById('targetLang').value,
+                        audio_id: null
+                    });
+                }
+            };
+            liveSocket.onclose = () => {
+                liveSocket = null;
+                const toggle = document.getElementById('liveToggle');
+                if (toggle) toggle.checked = false;
+            };
+        }
+
+        function stopLive() {
+            if (liveSocket) {
+                liveSocket.close();
+                liveSocket = null;
+            }
+        }
+
+        const liveToggle = document.getElementById('liveToggle');
+        if (liveToggle) {
+            liveToggle.addEventListener('change', () => liveToggle.checked ? startLive() : stopLive());
+            textarea.addEventListener('input', sendLiveEdit);
+            document.getElementById('sourceLang').addEventListener('change', sendLiveConfig);
+            document.getElementById('targetLang').addEventListener('change', sendLiveConfig);
+        }
+
         // Form submit
         const translateForm = document.getElementById('translateForm');
         if (translateForm) {
-            translateForm.onsubmit = function() {
+            translateForm.onsubmit = function(event) {
+                if (window.fetch && window.AbortController) {
+                    event.preventDefault();
+                    translateInPlace();
+                    return false;
+                }
+
                 const loader = document.getElementById('loader');
                 const button = document.querySelector('.translate-button');
                 
@@ -1654,6 +2040,12 @@ HTML_PAGE = """
                 loadVoices();
             }
             
+            // Playing the current result can reuse the audio the server prepared
+            const resultEl = document.getElementById('translatedText');
+            if (preparedAudioId && resultEl) {
+                speechIds[preparedAudioLang + '\\n' + resultEl.textContent] = preparedAudioId;
+            }
+
             // Always enable cloud voice as fallback
             useCloudVoice = true;
             showNotification('Cloud voice ready for all languages', '☁️');
@@ -1702,7 +2094,7 @@ HTML_PAGE = """
         console.log('%cTamil Voice: Using CLOUD backup', 'color: #8a2be2');
 
         // Hover effects
-        document.querySelectorAll('.history-item').forEach(item => {
+        function addHistoryHover(item) {
             item.addEventListener('mousemove', (e) => {
                 const rect = item.getBoundingClientRect();
                 const x = e.clientX - rect.left;
@@ -1714,60 +2106,443 @@ HTML_PAGE = """
             item.addEventListener('mouseleave', () => {
                 item.style.background = '';
             });
-        });
+        }
+        document.querySelectorAll('.history-item').forEach(addHistoryHover);
     </script>
 </body>
 </html>
 """
 
+# Served through the template loader so it is compiled once and cached,
+# rather than recompiled on every render_template_string() call
+app.jinja_loader = DictLoader({'page.html': HTML_PAGE})
+
+@app.route('/api/translate/batch', methods=['POST'])
+@rate_limit(limit=5, per=60)
+@admission_control()
+def translate_batch():
+    """Translate a list of short texts, packing them into as few upstream calls as possible"""
+    set_priority('batch')
+    payload = request.get_json(silent=True) or {}
+    texts = payload.get('texts')
+    source = payload.get('source', 'auto')
+    target = payload.get('target', 'en')
+
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return {'error': "'texts' must be a list of strings"}, 400
+    if any(len(t) > MAX_REQUEST_CHARS for t in texts):
+        return {'error': f"Each text must be at most {MAX_REQUEST_CHARS} characters"}, 400
+    error = languages.validate(source, target)
+    if error:
+        return {'error': error}, 400
+
+    try:
+        results = translator.translate_many(texts, source, target)
+    except Cancelled as e:
+        app.logger.info(f"Batch translation abandoned: {str(e)}")
+        return {'error': str(e)}, 503
+    except Exception as e:
+        app.logger.error(f"Batch translation error: {str(e)}")
+        return {'error': f"Translation failed: {str(e)}"}, 502
+
+    return {'translations': results, 'source': source, 'target': target}
+
+@app.route('/api/translate/multi', methods=['POST'])
+@rate_limit(limit=5, per=60)
+@admission_control()
+def translate_multi():
+    """Translate one text into several target languages concurrently"""
+    payload = request.get_json(silent=True) or {}
+    text = payload.get('text')
+    source = payload.get('source', 'auto')
+    targets = payload.get('targets') or list(DEFAULT_LANGUAGES)
+    stream = bool(payload.get('stream'))
+
+    if not isinstance(text, str) or not text.strip():
+        return {'error': 'Please enter some text to translate'}, 400
+    if len(text) > MAX_REQUEST_CHARS:
+        return {'error': f"Text exceeds maximum length of {MAX_REQUEST_CHARS} characters"}, 400
+    if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+        return {'error': "'targets' must be a list of language codes"}, 400
+    error = next(filter(None, (languages.validate(source, t) for t in targets)), None)
+    if error:
+        return {'error': error}, 400
+
+    # Detect once instead of letting every upstream call re-detect
+    if source == 'auto':
+        detected = translator.detect(text)
+        # A code some target cannot be translated from leaves detection to the provider
+        if detected != 'auto' and not any(languages.validate(detected, target) for target in targets):
+            source = detected
+
+    def run(target):
+        if target == source:
+            return {'target': target, 'translation': text}
+        try:
+            return {'target': target, 'translation': translator.translate(text, source, target)}
+        except Exception as e:
+            app.logger.error(f"Fan-out translation error ({target}): {str(e)}")
+            return {'target': target, 'error': f"Translation failed: {str(e)}"}
+
+    futures = [fanout_executor.submit(contextvars.copy_context().run, run, target)
+               for target in dict.fromkeys(targets)]
+
+    if stream:
+        def generate():
+            yield json.dumps({'source': source}) + '\n'
+            for future in as_completed(futures):
+                yield json.dumps(future.result(), ensure_ascii=False) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    return {'source': source, 'results': [future.result() for future in futures]}
+
+def admitted_translate(text, source='auto', target='en'):
+    """translator.translate under a translate admission slot, for work outside a request
+
+    Runs under the caller's deadline (a live session's pass), or a budget of its own.
+    """
+    deadline = current_deadline()
+    own = deadline is None
+    if own:
+        deadline = start_deadline(REQUEST_BUDGET_SECONDS)
+    try:
+        release = admission['translate'].acquire(deadline)
+        try:
+            return translator.translate(text, source, target)
+        finally:
+            release()
+    finally:
+        if own:
+            clear_deadline()
+
+def live_translate(ws):
+    """Translate-as-you-type: receives text edits, pushes changed sentences back"""
+    # Each upstream call waits for admission like any other request; a shed
+    # one reaches the client as an error message
+    session = LiveSession(admitted_translate, lambda message: ws.send(json.dumps(message, ensure_ascii=False)),
+                          budget=REQUEST_BUDGET_SECONDS)
+    try:
+        while True:
+            message = json.loads(ws.receive())
+            kind = message.get('type')
+            if kind == 'config':
+                source, target = message.get('source', 'auto'), message.get('target', 'en')
+                error = languages.validate(source, target)
+                if error:
+                    ws.send(json.dumps({'type': 'error', 'message': error}))
+                    continue
+                session.configure(source, target)
+            elif kind == 'edit':
+                session.apply_edit(int(message.get('pos', 0)), int(message.get('delete', 0)), message.get('insert', ''))
+                if len(session.text) > MAX_REQUEST_CHARS:
+                    ws.send(json.dumps({'type': 'error', 'message': f"Text exceeds maximum length of {MAX_REQUEST_CHARS} characters"}))
+                    break
+            elif kind == 'text':
+                session.set_text(message.get('text', '')[:MAX_REQUEST_CHARS])
+    except Exception as e:
+        # Client went away or sent something unreadable
+        app.logger.info(f"Live translation session closed: {str(e)}")
+    finally:
+        session.close()
+        app.logger.info(f"Live session: {session.edits} edits, {session.upstream_calls} upstream calls")
+
+if sock is not None:
+    sock.route('/ws/translate')(live_translate)
+    # Rate limited before the WebSocket handshake, like the HTTP routes
+    app.view_functions['live_translate'] = rate_limit(limit=5, per=60)(app.view_functions['live_translate'])
+
+def translate_in_background(texts, source, target):
+    """translate_many for work nobody is waiting on, behind interactive and batch requests"""
+    with priority('background'):
+        return translator.translate_many(texts, source, target)
+
+# Bulk file translation jobs; state lives on disk so jobs survive a restart
+file_jobs = JobManager(
+    os.environ.get('JOBS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs')),
+    translate_in_background,
+    workers=int(os.environ.get('JOB_WORKERS', '2')),
+    start=not DEFER_BACKGROUND_THREADS,
+)
+
+def start_background_threads():
+    """Start job, speculative speech and language refresh threads held back by DEFER_BACKGROUND_THREADS"""
+    file_jobs.start()
+    speech_service.start()
+    languages.start()
+
+def job_view(state):
+    view = progress(state)
+    view['status_url'] = url_for('job_status', job_id=state['id'])
+    view['events_url'] = url_for('job_events', job_id=state['id'])
+    if state['status'] == 'done':
+        view['download_url'] = url_for('job_download', job_id=state['id'])
+    return view
+
+@app.route('/api/jobs', methods=['POST'])
+@rate_limit(limit=5, per=60)
+def create_job():
+    """Upload a .txt, .md, .csv, .jsonl or .json file for background translation"""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return {'error': 'Please upload a file'}, 400
+    columns = [c.strip() for c in request.form.get('columns', '').split(',') if c.strip()] or None
+    source = request.form.get('source', 'auto')
+    target = request.form.get('target', 'en')
+    error = languages.validate(source, target)
+    if error:
+        return {'error': error}, 400
+
+    try:
+        state = file_jobs.submit(upload, upload.filename, source, target, columns)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return job_view(state), 202
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    state = file_jobs.get(job_id)
+    if state is None:
+        return {'error': 'Job not found'}, 404
+    return job_view(state)
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent progress events until the job finishes"""
+    if file_jobs.get(job_id) is None:
+        return {'error': 'Job not found'}, 404
+
+    def generate():
+        last = None
+        while True:
+            view = job_view(file_jobs.get(job_id))
+            if view != last:
+                yield f"data: {json.dumps(view)}\n\n"
+                last = view
+            if view['status'] in ('done', 'failed'):
+                return
+            file_jobs.wait_for_change(timeout=15)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@app.route('/api/jobs/<job_id>/download')
+def job_download(job_id):
+    state = file_jobs.get(job_id)
+    if state is None:
+        return {'error': 'Job not found'}, 404
+    if state['status'] != 'done':
+        return {'error': f"Job is {state['status']}"}, 409
+    return send_file(file_jobs.output_path(state), as_attachment=True,
+                     download_name=f"translated_{state['filename']}")
+
+@app.route('/api/subtitles', methods=['POST'])
+@rate_limit(limit=5, per=60)
+@admission_control()
+def translate_subtitles():
+    """Translate an uploaded .srt or .vtt file, streaming it back with the original timings"""
+    set_priority('batch')
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return {'error': 'Please upload a subtitle file'}, 400
+    extension = os.path.splitext(upload.filename)[1].lower()
+    if extension not in SUBTITLE_FORMATS:
+        return {'error': f"Unsupported file type '{extension}', expected .srt or .vtt"}, 400
+    source = request.form.get('source', 'auto')
+    target = request.form.get('target', 'en')
+    error = languages.validate(source, target)
+    if error:
+        return {'error': error}, 400
+
+    # Even a feature film's subtitles are a few hundred kilobytes; the upload is
+    # closed once this view returns, so read it now and stream only the output
+    try:
+        lines = upload.read().decode('utf-8-sig').splitlines()
+    except UnicodeDecodeError:
+        return {'error': 'Subtitle files must be UTF-8 encoded'}, 400
+    groups = cue_windows(parse_subtitles(lines), translator.router.char_limit(source, target) or MAX_REQUEST_CHARS)
+    # Translate the first group up front so that bad input still gets a proper error status
+    try:
+        first = next(groups, None)
+        first = translate_window(first, translator.translate_many, source, target) if first else ''
+    except Exception as e:
+        app.logger.error(f"Subtitle translation error: {str(e)}")
+        return {'error': f"Translation failed: {str(e)}"}, 502
+
+    deadline = g.deadline
+
+    def generate():
+        yield first
+        for group in groups:
+            # The budget is per group, as a film takes longer than one request's worth
+            deadline.extend(REQUEST_BUDGET_SECONDS)
+            yield translate_window(group, translator.translate_many, source, target)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=SUBTITLE_FORMATS[extension],
+        headers={'Content-Disposition': f'attachment; filename="translated_{target}{extension}"'},
+    )
+
+@app.route('/stats')
+def stats():
+    """Cache and upstream usage counters"""
+    return {
+        **translator.stats(),
+        **speech_service.stats(),
+        'bulkheads': {
+            name: {
+                'admission': admission[name].stats(),
+                'scheduler': bulkhead.scheduler.stats(),
+                'resilience': bulkhead.stats(),
+            }
+            for name, bulkhead in (('translate', resilience), ('speech', speech_resilience))
+        },
+        'client_disconnects': disconnect_watcher.disconnects,
+        'languages': languages.stats(),
+        'process': process_memory(),
+    }
+
+def validate_text(text):
+    """Error message for unusable input, or None"""
+    if not text or len(text.strip()) == 0:
+        return "Please enter some text to translate"
+    if len(text) > 5000:
+        return "Text exceeds maximum length of 5000 characters"
+    return None
+
+def process_translation(text, source, target, fmt=None):
+    """Validate, translate and record one request; returns (result, error, audio_id)
+
+    Unmistakable HTML is detected, and fmt can ask for HTML or Markdown;
+    only their text is translated, so markup comes back unchanged.
+    """
+    result = ""
+    error = None
+    audio_ready_id = None
+
+    try:
+        # Validate input, languages included, before anything goes upstream
+        error = validate_text(text) or languages.validate(source, target)
+        if error is None:
+            result = translator.translate_document(text, source, target, fmt)
+            
+            if not result or result.strip() == "":
+                error = "No translation available"
+            else:
+                # Add to history
+                translation_history.appendleft({
+                    'original': text[:50] + ('...' if len(text) > 50 else ''),
+                    'translated': result[:50] + ('...' if len(result) > 50 else ''),
+                    'source': source,
+                    'target': target
+                })
+
+                # Start synthesizing the result before the user presses play
+                if speech_service.speculative is not None and languages.supports_speech(target):
+                    audio_ready_id = speech_service.prepare(result, target, owner=request.remote_addr)
+    
+    except Cancelled as e:
+        # The client is gone; nobody will see this answer
+        error = str(e)
+        app.logger.info(f"Translation abandoned: {str(e)}")
+    except Exception as e:
+        error = f"Translation failed: {str(e)}"
+        # Log the error for debugging
+        app.logger.error(f"Translation error: {str(e)}")
+
+    return result, error, audio_ready_id
+
+@app.route('/api/translate', methods=['POST'])
+@rate_limit(limit=5, per=60)
+@admission_control()
+def api_translate():
+    """Translate without re-rendering the page; returns only what the page needs to update"""
+    payload = request.get_json(silent=True) or {}
+    text = payload.get('text')
+    source = payload.get('source', 'auto')
+    target = payload.get('target', 'en')
+    fmt = payload.get('format')
+    error = validate_text(text) if isinstance(text, str) else "Please enter some text to translate"
+    if fmt not in (None, 'text', 'html', 'markdown'):
+        error = "'format' must be one of text, html or markdown"
+    error = error or languages.validate(source, target)
+    if error:
+        return {'error': error}, 400
+
+    result, error, audio_ready_id = process_translation(text, source, target, fmt)
+    if error:
+        return {'error': error}, 502
+    return {
+        'translation': result,
+        'source': source,
+        'target': target,
+        'audio_id': audio_ready_id,
+        'history': list(translation_history),
+    }
+
 @app.route("/", methods=["GET", "POST"])
 @rate_limit(limit=5, per=60)  # 5 requests per minute
+@admission_control('translate', methods=('POST',))
 def home():
     result = ""
     error = None
+    audio_ready_id = None
     target_lang = "en"  # Default target language
+    input_format = None
 
     if request.method == "POST":
         text = request.form["text"]
         source = request.form["source"]
         target = request.form["target"]
         target_lang = target
+        input_format = request.form.get("format") or None
 
-        try:
-            # Validate input
-            if not text or len(text.strip()) == 0:
-                error = "Please enter some text to translate"
-            elif len(text) > 5000:
-                error = "Text exceeds maximum length of 5000 characters"
-            else:
-                # Perform translation
-                translator = GoogleTranslator(source=source, target=target)
-                result = translator.translate(text)
-                
-                if not result or result.strip() == "":
-                    error = "No translation available"
-                else:
-                    # Add to history
-                    translation_history.appendleft({
-                        'original': text[:50] + ('...' if len(text) > 50 else ''),
-                        'translated': result[:50] + ('...' if len(result) > 50 else ''),
-                        'source': source,
-                        'target': target
-                    })
-        
-        except Exception as e:
-            error = f"Translation failed: {str(e)}"
-            # Log the error for debugging
-            app.logger.error(f"Translation error: {str(e)}")
-
-    return render_template_string(
-        HTML_PAGE, 
-        result=result, 
-        error=error, 
+        if input_format not in (None, 'text', 'html', 'markdown'):
+            error = "'format' must be one of text, html or markdown"
+        else:
+            result, error, audio_ready_id = process_translation(text, source, target, input_format)
+
+    return render_page(
+        result=result,
+        error=error,
         history=list(translation_history),
-        target_lang=target_lang
+        target_lang=target_lang,
+        input_format=input_format,
+        audio_id=audio_ready_id,
     )
 
+def render_page(**context):
+    return render_template('page.html', live_enabled=sock is not None, language_options=languages.options(),
+                           speech_languages=sorted(languages.speech), **context)
+
+def process_memory():
+    """Resident (RSS) and proportional (PSS) set size of this process in bytes
+
+    PSS splits pages shared with the master and sibling workers between
+    them, so it shows what each worker really costs. Linux only; elsewhere
+    the peak RSS is reported.
+    """
+    memory = {'pid': os.getpid(), 'rss_bytes': None, 'pss_bytes': None}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    memory[f"{key.lower()}_bytes"] = int(value.split()[0]) * 1024
+    except OSError:
+        try:
+            import resource
+            memory['rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            pass
+    return memory
+
+def warm_up():
+    """Load the backend libraries and language snapshot, then compile the page template and render it once"""
+    import_backends()
+    languages.refresh_if_stale()
+    with app.test_request_context('/'):
+        render_page(result='', error=None, history=[], target_lang='en', audio_id=None)
+
 
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,195 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+from service import TranslationService
+
+# Attempts per batch before the run stops (it can be resumed from the checkpoint)
+BATCH_ATTEMPTS = 3
+
+# Seconds between checkpoints; each one costs an fsync of the output
+CHECKPOINT_INTERVAL = 2.0
+
+
+def read_jsonl(stream):
+    """Records of a JSONL text stream; blank lines are skipped"""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    return csv.DictReader(stream)
+
+
+def format_jsonl(record):
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def batches(records, size, skip=0):
+    """Lists of up to size records, after skipping the first skip records"""
+    batch = []
+    for i, record in enumerate(records):
+        if i < skip:
+            continue
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def translate_batch(translator, batch, field, into, source, target):
+    """Translate field of every record in batch into into, in place"""
+    wanted = [i for i, record in enumerate(batch)
+              if isinstance(record.get(field), str) and record[field].strip()]
+    for attempt in range(BATCH_ATTEMPTS):
+        try:
+            translated = translator.translate_many([batch[i][field] for i in wanted], source, target)
+            break
+        except Exception:
+            if attempt == BATCH_ATTEMPTS - 1:
+                raise
+            sleep(2 ** attempt)
+    for i, text in zip(wanted, translated):
+        batch[i][into] = text
+    return batch
+
+
+def load_checkpoint(path, settings):
+    if not path or not os.path.exists(path):
+        return {'rows': 0, 'output_size': 0}
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('settings') != settings:
+        raise SystemExit(f"{path} was written for a different run; delete it to start over")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Translate one field of every record in a JSONL or CSV file, keeping input order",
+    )
+    parser.add_argument('input', help="input file, or - for stdin")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    parser.add_argument('-f', '--field', required=True, help="field (JSONL key or CSV column) to translate")
+    parser.add_argument('--into', help="field to write the translation to (default: replace --field)")
+    parser.add_argument('-s', '--source', default='auto', help="source language code (default: auto)")
+    parser.add_argument('-t', '--target', required=True, help="target language code")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="input format (default: from the file extension)")
+    parser.add_argument('-j', '--workers', type=int, default=8, help="batches translated concurrently (default: 8)")
+    parser.add_argument('--batch-size', type=int, default=100, help="records per batch (default: 100)")
+    parser.add_argument('--checkpoint', help="checkpoint file (default: OUTPUT.checkpoint when --output is set)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    into = args.into or args.field
+    checkpoint_path = args.checkpoint or (args.output + '.checkpoint' if args.output else None)
+    if checkpoint_path and not args.output:
+        raise SystemExit("--checkpoint needs --output: stdout cannot be rewound on resume")
+
+    # Configured from the same environment variables as the web app
+    translator = TranslationService.from_env()
+    settings = {'input': args.input, 'format': fmt, 'field': args.field, 'into': into,
+                'source': args.source, 'target': args.target, 'batch_size': args.batch_size}
+    checkpoint = load_checkpoint(checkpoint_path, settings)
+    checkpoint['settings'] = settings
+
+    if args.input == '-':
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    else:
+        source = open(args.input, encoding='utf-8', newline='')
+    if args.output:
+        output = open(args.output, 'ab')
+        # Drop anything written after the last checkpoint by an interrupted run
+        output.truncate(checkpoint['output_size'])
+        output.seek(checkpoint['output_size'])
+    else:
+        output = sys.stdout.buffer
+
+    if fmt == 'csv':
+        reader = read_csv(source)
+        fieldnames = list(reader.fieldnames or [])
+        if into not in fieldnames:
+            fieldnames.append(into)
+
+        def render(record):
+            buffer = io.StringIO()
+            csv.DictWriter(buffer, fieldnames, lineterminator='\n').writerow(record)
+            return buffer.getvalue()
+
+        if checkpoint['output_size'] == 0 and fieldnames:
+            output.write(render(dict(zip(fieldnames, fieldnames))).encode('utf-8'))
+        records = reader
+    else:
+        render = format_jsonl
+        records = read_jsonl(source)
+
+    progress = sys.stderr.isatty()
+    started = last_checkpoint = monotonic()
+    done = resumed_from = checkpoint['rows']
+    executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='batch')
+    try:
+        # Results are written strictly in input order; at most two batches per
+        # worker are held in memory, so arbitrarily long inputs stream through
+        in_flight = deque()
+        pending = batches(records, args.batch_size, skip=checkpoint['rows'])
+        while True:
+            while len(in_flight) < args.workers * 2:
+                batch = next(pending, None)
+                if batch is None:
+                    break
+                in_flight.append(executor.submit(translate_batch, translator, batch, args.field, into,
+                                                 args.source, args.target))
+            if not in_flight:
+                break
+            batch = in_flight.popleft().result()
+            output.write(''.join(render(record) for record in batch).encode('utf-8'))
+            output.flush()
+            done += len(batch)
+            if checkpoint_path and (monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL or not in_flight):
+                last_checkpoint = monotonic()
+                os.fsync(output.fileno())
+                checkpoint['rows'] = done
+                checkpoint['output_size'] = output.tell()
+                save_checkpoint(checkpoint_path, checkpoint)
+            if progress:
+                rate = (done - resumed_from) / max(monotonic() - started, 1e-6)
+                print(f"\r{done} records, {rate:.0f}/s", end='', file=sys.stderr)
+    except Exception as e:
+        print(f"\nTranslation stopped after {done} records: {e}", file=sys.stderr)
+        if checkpoint_path:
+            print(f"Run the same command again to resume from {checkpoint_path}", file=sys.stderr)
+        return 1
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if args.input != '-':
+            source.close()
+        if args.output:
+            output.close()
+
+    if progress:
+        print(file=sys.stderr)
+    if checkpoint_path:
+        os.remove(checkpoint_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
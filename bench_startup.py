@@ -0,0 +1,105 @@
+"""Cold-start benchmark: import time per module and time to the first successful request
+
+    python bench_startup.py [--runs 5] [--top 15] [--translate]
+
+Each run starts a fresh interpreter. Import times come from python -X importtime
+for "import app"; readiness is measured from process start until GET / (and,
+with --translate, POST /api/translate) first answers 200 on a local server.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import urllib.request
+from time import perf_counter, sleep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVER = (
+    "import sys, app; "
+    "from werkzeug.serving import make_server; "
+    "make_server('127.0.0.1', int(sys.argv[1]), app.app, threaded=True).serve_forever()"
+)
+
+
+def import_times(env):
+    """{module: (self_us, cumulative_us, indent)} for one cold "import app" """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative), len(name) - len(name.lstrip()))
+    return times
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request_ok(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def time_to_ready(env, translate):
+    """Seconds from process start until the server has answered each check with 200"""
+    port = free_port()
+    started = perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', SERVER, str(port)], cwd=HERE, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        while not request_ok(base + '/'):
+            if process.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            sleep(0.005)
+        timings = {'first_page': perf_counter() - started}
+        if translate:
+            if not request_ok(base + '/api/translate', {'text': 'Good morning', 'target': 'fr'}):
+                raise RuntimeError("First translation failed")
+            timings['first_translation'] = perf_counter() - started
+        return timings
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="modules to list by cumulative import time")
+    parser.add_argument('--translate', action='store_true', help="also time the first /api/translate")
+    args = parser.parse_args()
+    env = dict(os.environ)
+
+    runs = [import_times(env) for _ in range(args.runs)]
+    total = statistics.median(run['app'][1] for run in runs) / 1000
+    print(f"import app: {total:.1f} ms (median of {args.runs})")
+    # Direct imports of app, plus what the interpreter itself loads at startup
+    shallow = {name for name, (_, _, indent) in runs[0].items() if indent <= 3 and name != 'app'}
+    ranked = sorted(shallow, key=lambda n: -statistics.median(r.get(n, (0, 0, 0))[1] for r in runs))
+    for name in ranked[:args.top]:
+        own = statistics.median(r.get(name, (0, 0, 0))[0] for r in runs) / 1000
+        cumulative = statistics.median(r.get(name, (0, 0, 0))[1] for r in runs) / 1000
+        print(f"  {name:<32} {cumulative:8.1f} ms  (self {own:.1f} ms)")
+
+    ready = [time_to_ready(env, args.translate) for _ in range(args.runs)]
+    for key in ready[0]:
+        print(f"{key.replace('_', ' ')}: {statistics.median(r[key] for r in ready) * 1000:.0f} ms after launch")
+
+
+if __name__ == '__main__':
+    main()
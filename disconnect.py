@@ -0,0 +1,62 @@
+import select
+import socket
+import threading
+from time import sleep
+
+# Windows has no MSG_DONTWAIT; there select() checks first that the peek won't block
+_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+
+class DisconnectWatcher:
+    """Cancels a request's deadline when its client closes the connection
+
+    One thread checks the sockets of requests in progress every interval
+    seconds. A socket that is readable but has no data to read was closed by
+    the client; a pipelined next request is data and does not count. TLS
+    sockets cannot be peeked at and are left alone.
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self._watched = {}  # key -> (socket, deadline)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.disconnects = 0
+
+    def watch(self, sock, deadline):
+        """Start watching a request's socket; returns a key for unwatch()"""
+        key = object()
+        with self._lock:
+            self._watched[key] = (sock, deadline)
+            # Started on first use, so that pre-forking servers start it in each worker
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='disconnect-watcher', daemon=True)
+                self._thread.start()
+        return key
+
+    def unwatch(self, key):
+        with self._lock:
+            self._watched.pop(key, None)
+
+    def _closed(self, sock):
+        try:
+            if not _DONTWAIT and not select.select([sock], [], [], 0)[0]:
+                return False
+            return sock.recv(1, socket.MSG_PEEK | _DONTWAIT) == b''
+        except (BlockingIOError, InterruptedError, ValueError):
+            # Nothing to read, or a TLS socket
+            return False
+        except OSError:
+            return True
+
+    def _run(self):
+        while True:
+            sleep(self.interval)
+            with self._lock:
+                watched = list(self._watched.items())
+            for key, (sock, deadline) in watched:
+                if self._closed(sock):
+                    deadline.cancel('client disconnected')
+                    with self._lock:
+                        if self._watched.pop(key, None) is not None:
+                            self.disconnects += 1
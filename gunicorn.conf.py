@@ -0,0 +1,57 @@
+# Production server: gunicorn -c gunicorn.conf.py app:app
+#
+# The master imports the app and renders the page once before forking, so
+# every worker starts with the modules, language tables and compiled template
+# already in memory and shares those pages with the master copy-on-write.
+import gc
+import multiprocessing
+import os
+
+# Background threads are started in each worker after the fork (see post_fork)
+os.environ.setdefault('DEFER_BACKGROUND_THREADS', '1')
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Requests mostly wait on upstream APIs, so each worker serves several at once
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', '24'))
+# Requests queue for admission on a worker thread; anything beyond the
+# threads would wait unseen in gunicorn's backlog. A few threads are kept for
+# pages and status polls, a quarter of the rest goes to the speech bulkhead
+# and the remainder to translation, each split between running and queued
+# requests (see admission.py).
+_guarded = max(4, threads - 4)
+for _prefix, _share in (('SPEECH_', _guarded // 4), ('', _guarded - _guarded // 4)):
+    os.environ.setdefault(f'{_prefix}ADMISSION_CONCURRENCY', str(max(1, _share // 2)))
+    os.environ.setdefault(f'{_prefix}ADMISSION_QUEUE', str(max(1, _share - _share // 2)))
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', '60'))
+keepalive = 5
+accesslog = os.environ.get('ACCESS_LOG')
+
+
+def _mib(value):
+    return f"{value / (1024 * 1024):.1f} MiB" if value is not None else "n/a"
+
+
+def when_ready(server):
+    import app
+    app.warm_up()
+    # Objects created so far live for the whole process. Freezing them keeps
+    # the workers' garbage collector from writing to (and so un-sharing)
+    # the pages they occupy.
+    gc.freeze()
+    memory = app.process_memory()
+    server.log.info(f"Preloaded app, master RSS {_mib(memory['rss_bytes'])}")
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background_threads()
+
+
+def post_worker_init(worker):
+    import app
+    memory = app.process_memory()
+    worker.log.info(f"Worker {memory['pid']} ready: RSS {_mib(memory['rss_bytes'])}, "
+                    f"PSS {_mib(memory['pss_bytes'])}")
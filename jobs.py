@@ -0,0 +1,368 @@
+import csv
+import io
+import json
+import os
+import queue
+import re
+import threading
+import uuid
+from time import sleep, time
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process runs the jobs anyway
+    fcntl = None
+
+# Units (lines, rows, records) translated per batch; output and checkpoint are
+# written after every batch, so memory per job stays bounded by this size.
+BATCH_UNITS = 100
+
+# Attempts per batch before the job is marked failed
+BATCH_ATTEMPTS = 3
+
+FORMATS = {
+    '.txt': 'text',
+    '.md': 'markdown',
+    '.markdown': 'markdown',
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.json': 'json',
+}
+
+# Markdown line prefixes that must not be sent upstream: headings, list bullets, quotes
+_MD_PREFIX_RE = re.compile(r"^(\s*(?:#{1,6}\s+|[-*+]\s+|>\s*|\d+[.)]\s+)*)(.*?)(\s*)$", re.S)
+
+
+class Unit:
+    """One line/row/record: the strings to translate and how to write the result"""
+
+    def __init__(self, strings, render, end_offset, checkpoint=None):
+        self.strings = strings
+        self.render = render
+        self.end_offset = end_offset
+        self.checkpoint = checkpoint or {}
+
+
+def _lines(f, offset):
+    """Decoded lines of a binary file from offset, with the offset after each line"""
+    f.seek(offset)
+    for raw in f:
+        offset += len(raw)
+        yield raw.decode('utf-8'), offset
+
+
+def _plain_line(line, end_offset, checkpoint=None):
+    """Translate a line's text while keeping its indentation and line ending"""
+    body = line.rstrip('\r\n')
+    ending = line[len(body):]
+    stripped = body.strip()
+    if not stripped:
+        return Unit([], lambda t: line, end_offset, checkpoint)
+    lead = body[:len(body) - len(body.lstrip())]
+    trail = body[len(body.rstrip()):]
+    return Unit([stripped], lambda t: f"{lead}{t[0]}{trail}{ending}", end_offset, checkpoint)
+
+
+def _text_units(f, state):
+    for line, end in _lines(f, state['input_offset']):
+        yield _plain_line(line, end)
+
+
+def _markdown_units(f, state):
+    in_fence = state.get('in_fence', False)
+    for line, end in _lines(f, state['input_offset']):
+        if line.lstrip().startswith(('```', '~~~')):
+            in_fence = not in_fence
+            yield Unit([], lambda t, line=line: line, end, {'in_fence': in_fence})
+            continue
+        if in_fence:
+            yield Unit([], lambda t, line=line: line, end, {'in_fence': in_fence})
+            continue
+        body = line.rstrip('\r\n')
+        ending = line[len(body):]
+        prefix, text, trail = _MD_PREFIX_RE.match(body).groups()
+        if not text.strip():
+            yield Unit([], lambda t, line=line: line, end, {'in_fence': in_fence})
+        else:
+            yield Unit([text], lambda t, p=prefix, tr=trail, e=ending: f"{p}{t[0]}{tr}{e}",
+                       end, {'in_fence': in_fence})
+
+
+def _csv_row(values):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(values)
+    return buffer.getvalue()
+
+
+def _csv_units(f, state):
+    consumed = [state['input_offset']]
+
+    def lines():
+        for line, end in _lines(f, state['input_offset']):
+            consumed[0] = end
+            yield line
+
+    reader = csv.reader(lines())
+    header = state.get('header')
+    if header is None:
+        header = next(reader, None)
+        if header is None:
+            return
+        yield Unit([], lambda t, h=header: _csv_row(h), consumed[0], {'header': header})
+
+    wanted = state.get('columns') or header
+    indices = [i for i, name in enumerate(header) if name in wanted]
+    for row in reader:
+        cells = [i for i in indices if i < len(row) and row[i].strip()]
+
+        def render(translations, row=row, cells=cells):
+            out = list(row)
+            for i, value in zip(cells, translations):
+                out[i] = value
+            return _csv_row(out)
+
+        yield Unit([row[i] for i in cells], render, consumed[0])
+
+
+def _strings_in(value, found):
+    if isinstance(value, str):
+        if value.strip():
+            found.append(value)
+    elif isinstance(value, list):
+        for item in value:
+            _strings_in(item, found)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _strings_in(item, found)
+    return found
+
+
+def _replace_strings(value, translations):
+    if isinstance(value, str):
+        return next(translations) if value.strip() else value
+    if isinstance(value, list):
+        return [_replace_strings(item, translations) for item in value]
+    if isinstance(value, dict):
+        return {key: _replace_strings(item, translations) for key, item in value.items()}
+    return value
+
+
+def _json_unit(document, end_offset, ending):
+    def render(translations):
+        replaced = _replace_strings(document, iter(translations))
+        return json.dumps(replaced, ensure_ascii=False) + ending
+    return Unit(_strings_in(document, []), render, end_offset)
+
+
+def _jsonl_units(f, state):
+    for line, end in _lines(f, state['input_offset']):
+        if not line.strip():
+            yield Unit([], lambda t, line=line: line, end)
+        else:
+            yield _json_unit(json.loads(line), end, '\n')
+
+
+def _json_units(f, state):
+    # A single JSON document has to be parsed whole; use .jsonl for unbounded inputs
+    f.seek(0)
+    data = f.read()
+    yield _json_unit(json.loads(data.decode('utf-8')), len(data), '')
+
+
+_UNITS = {
+    'text': _text_units,
+    'markdown': _markdown_units,
+    'csv': _csv_units,
+    'jsonl': _jsonl_units,
+    'json': _json_units,
+}
+
+
+class JobManager:
+    """Asynchronous file translation jobs persisted under a directory
+
+    Each job keeps its upload, its partial output and a state.json checkpoint.
+    The checkpoint holds the input offset, units done and output size after
+    the last finished batch. Jobs left queued or running by a previous
+    process are resumed from their checkpoint on startup. Several processes
+    may share one root: a lock file makes sure each job runs in only one.
+    """
+
+    def __init__(self, root, translate_batch, workers=2, start=True):
+        self.root = root
+        self.workers = workers
+        self._translate_batch = translate_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._started = False
+        os.makedirs(root, exist_ok=True)
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the worker threads and pick up unfinished jobs; safe to call twice"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'file-job-{i}', daemon=True).start()
+        self._resume()
+
+    def _dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def _save(self, state):
+        path = os.path.join(self._dir(state['id']), 'state.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+        with self._changed:
+            self._changed.notify_all()
+
+    def get(self, job_id):
+        """Current state of a job, or None if unknown"""
+        if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+            return None
+        try:
+            with open(os.path.join(self._dir(job_id), 'state.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def wait_for_change(self, timeout):
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def output_path(self, state):
+        return os.path.join(self._dir(state['id']), 'output' + state['extension'])
+
+    def submit(self, upload, filename, source, target, columns=None):
+        """Store an uploaded file object and queue it; returns the job state"""
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in FORMATS:
+            raise ValueError(f"Unsupported file type '{extension}', expected one of {', '.join(FORMATS)}")
+
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._dir(job_id))
+        input_path = os.path.join(self._dir(job_id), 'input' + extension)
+        upload.save(input_path)
+
+        state = {
+            'id': job_id,
+            'filename': filename,
+            'extension': extension,
+            'format': FORMATS[extension],
+            'source': source,
+            'target': target,
+            'columns': columns,
+            'status': 'queued',
+            'error': None,
+            'created': time(),
+            'total_bytes': os.path.getsize(input_path),
+            'input_offset': 0,
+            'output_size': 0,
+            'units_done': 0,
+        }
+        self._save(state)
+        self._queue.put(job_id)
+        return state
+
+    def _resume(self):
+        for job_id in sorted(os.listdir(self.root)):
+            state = self.get(job_id)
+            if state and state['status'] in ('queued', 'running'):
+                self._queue.put(job_id)
+
+    def _claim(self, job_id):
+        """Open and lock the job's lock file, or return None if another process holds it"""
+        lock = open(os.path.join(self._dir(job_id), 'lock'), 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return None
+        return lock
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            lock = self._claim(job_id)
+            if lock is None:
+                continue
+            with lock:
+                # Re-read under the lock: another process may have finished it meanwhile
+                state = self.get(job_id)
+                if state is None or state['status'] in ('done', 'failed'):
+                    continue
+                try:
+                    self._run(state)
+                except Exception as e:
+                    state['status'] = 'failed'
+                    state['error'] = str(e)
+                    self._save(state)
+
+    def _run(self, state):
+        state['status'] = 'running'
+        self._save(state)
+        input_path = os.path.join(self._dir(state['id']), 'input' + state['extension'])
+        part_path = self.output_path(state) + '.part'
+
+        with open(input_path, 'rb') as source, open(part_path, 'ab') as output:
+            # Drop anything written after the last checkpoint by an interrupted run
+            output.truncate(state['output_size'])
+            output.seek(state['output_size'])
+
+            batch = []
+            for unit in _UNITS[state['format']](source, state):
+                batch.append(unit)
+                if len(batch) >= BATCH_UNITS:
+                    self._flush(state, batch, output)
+                    batch = []
+            if batch:
+                self._flush(state, batch, output)
+
+        os.replace(part_path, self.output_path(state))
+        state['status'] = 'done'
+        state['input_offset'] = state['total_bytes']
+        self._save(state)
+
+    def _flush(self, state, batch, output):
+        strings = [s for unit in batch for s in unit.strings]
+        translated = []
+        for attempt in range(BATCH_ATTEMPTS):
+            try:
+                translated = self._translate_batch(strings, state['source'], state['target']) if strings else []
+                break
+            except Exception:
+                if attempt == BATCH_ATTEMPTS - 1:
+                    raise
+                sleep(2 ** attempt)
+        translations = iter(translated)
+        rendered = ''.join(unit.render([next(translations) for _ in unit.strings]) for unit in batch)
+
+        output.write(rendered.encode('utf-8'))
+        output.flush()
+        os.fsync(output.fileno())
+
+        state['input_offset'] = batch[-1].end_offset
+        state['output_size'] = output.tell()
+        state['units_done'] += len(batch)
+        for unit in batch:
+            state.update(unit.checkpoint)
+        self._save(state)
+
+
+def progress(state):
+    """Public view of a job state"""
+    total = state['total_bytes'] or 1
+    return {
+        'id': state['id'],
+        'filename': state['filename'],
+        'status': state['status'],
+        'error': state['error'],
+        'units_done': state['units_done'],
+        'progress': round(min(1.0, state['input_offset'] / total), 4),
+    }
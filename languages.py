@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import threading
+from time import sleep, time
+
+logger = logging.getLogger(__name__)
+
+# Used until the first snapshot exists, and as the default fan-out targets
+DEFAULT_LANGUAGES = {
+    'en': 'English', 'ta': 'Tamil', 'hi': 'Hindi', 'fr': 'French', 'de': 'German', 'es': 'Spanish',
+    'zh-CN': 'Chinese', 'ja': 'Japanese', 'ko': 'Korean', 'ru': 'Russian', 'ar': 'Arabic', 'it': 'Italian',
+}
+
+# Flags shown next to the languages the page has always offered
+_FLAGS = {
+    'en': '🇬🇧', 'ta': '🇮🇳', 'hi': '🇮🇳', 'fr': '🇫🇷', 'de': '🇩🇪', 'es': '🇪🇸',
+    'zh-CN': '🇨🇳', 'ja': '🇯🇵', 'ko': '🇰🇷', 'ru': '🇷🇺', 'ar': '🇸🇦', 'it': '🇮🇹',
+}
+
+
+def fetch_languages(providers):
+    """{'translation': {code: name}, 'speech': {code: name}} from the provider and gTTS libraries
+
+    A translation language is kept when at least one of providers handles it.
+    """
+    from deep_translator.constants import GOOGLE_LANGUAGES_TO_CODES
+    from gtts.lang import tts_langs
+
+    translation = {code: name.title() for name, code in GOOGLE_LANGUAGES_TO_CODES.items()
+                   if any(p.supports(code, code) for p in providers)}
+    return {'translation': translation, 'speech': dict(tts_langs())}
+
+
+class LanguageCatalog:
+    """Supported translation and speech languages, snapshotted to disk
+
+    The snapshot at path is read at startup, so requests are validated from
+    the first one on without touching the network or the provider libraries.
+    A background thread fetches a fresh copy when the snapshot is missing or
+    older than refresh_seconds, and again every refresh_seconds after that.
+    Lookups are set membership tests.
+    """
+
+    def __init__(self, path, fetch, refresh_seconds=86400.0, start=True):
+        self.path = path
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        self.fetched_at = None
+        self._set(DEFAULT_LANGUAGES, DEFAULT_LANGUAGES)
+        self._thread = None
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self._set(snapshot['translation'], snapshot['speech'])
+            self.fetched_at = snapshot['fetched_at']
+        except (OSError, ValueError, KeyError) as e:
+            logger.info(f"No usable language snapshot at {path} ({e}); using the built-in list until fetched")
+        if start:
+            self.start()
+
+    def _set(self, translation, speech):
+        # Replaced wholesale, so readers never see a half-updated catalog
+        self.translation = dict(sorted(translation.items(), key=lambda item: item[1]))
+        self.speech = dict(speech)
+        self._translation_codes = frozenset(translation)
+        self._speech_codes = frozenset(speech)
+
+    def stale(self):
+        return self.fetched_at is None or time() - self.fetched_at >= self.refresh_seconds
+
+    def refresh(self):
+        """Fetch the language lists now and write them to the snapshot"""
+        languages = self.fetch()
+        fetched_at = time()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': fetched_at, **languages}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._set(languages['translation'], languages['speech'])
+        self.fetched_at = fetched_at
+        logger.info(f"Language snapshot refreshed: {len(self.translation)} translation, "
+                    f"{len(self.speech)} speech languages")
+
+    def refresh_if_stale(self):
+        if self.stale():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Could not refresh the language snapshot: {e}")
+
+    def start(self):
+        """Start the background refresh thread if it was deferred"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='language-refresh', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh_if_stale()
+            sleep(max(60.0, self.refresh_seconds - (time() - (self.fetched_at or 0))))
+
+    def supports_speech(self, lang):
+        return isinstance(lang, str) and lang in self._speech_codes
+
+    def validate(self, source, target):
+        """Error message for an unsupported language pair, or None"""
+        if not isinstance(source, str) or not isinstance(target, str):
+            return "'source' and 'target' must be language codes"
+        if source != 'auto' and source not in self._translation_codes:
+            return f"Unsupported source language '{source}'"
+        if target not in self._translation_codes:
+            return f"Unsupported target language '{target}'"
+        return None
+
+    def options(self):
+        """(code, label) for each translation language, for the page's language menus"""
+        return [(code, f"{_FLAGS[code]} {name.upper()}" if code in _FLAGS else name.upper())
+                for code, name in self.translation.items()]
+
+    def stats(self):
+        return {
+            'translation': len(self._translation_codes),
+            'speech': len(self._speech_codes),
+            'fetched_at': self.fetched_at,
+        }
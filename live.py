@@ -0,0 +1,142 @@
+import re
+import threading
+from time import time
+
+from resilience import clear_deadline, start_deadline
+
+# Keep each sentence with its terminator so unchanged sentences hash the same
+_SENTENCE_RE = re.compile(r"[^.!?।。！？؟\n]+(?:[.!?।。！？؟]+|\n+|$)|\n+")
+
+MAX_CACHED_SENTENCES = 1000
+
+
+def split_sentences(text):
+    """Sentences of text, stripped, in order"""
+    return [s.strip() for s in _SENTENCE_RE.findall(text) if s.strip()]
+
+
+class LiveSession:
+    """Translate-as-you-type state for one connection
+
+    Edits are applied as they arrive, but translation only starts once the
+    text has been quiet for debounce seconds. Only sentences not seen before
+    go upstream, and a newer edit abandons the remaining sentences of an
+    older pass and cancels the pass's deadline, so its in-flight call stops
+    waiting too. Each sentence gets budget seconds. Each finished pass
+    pushes just the sentences that changed.
+    """
+
+    def __init__(self, translate, send, debounce=0.4, budget=10.0):
+        self._translate = translate
+        self._send = send
+        self.debounce = debounce
+        self.budget = budget
+        self._deadline = None  # deadline of the pass in progress
+        self.text = ''
+        self.source = 'auto'
+        self.target = 'en'
+        self._version = 0
+        self._last_edit = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._cache = {}  # (source, target, sentence) -> translation
+        self._pushed = []  # translated sentences the client currently shows
+        self.edits = 0
+        self.upstream_calls = 0
+        self.superseded = 0
+        threading.Thread(target=self._run, name='live-translate', daemon=True).start()
+
+    def _cancel_pass(self, reason):
+        if self._deadline is not None:
+            self._deadline.cancel(reason)
+
+    def _changed(self):
+        self._version += 1
+        self._last_edit = time()
+        self._cancel_pass('superseded by newer input')
+        self._cond.notify()
+
+    def apply_edit(self, pos, delete, insert):
+        """Replace delete characters at pos with insert"""
+        with self._cond:
+            pos = max(0, min(pos, len(self.text)))
+            self.text = self.text[:pos] + insert + self.text[pos + max(delete, 0):]
+            self.edits += 1
+            self._changed()
+
+    def set_text(self, text):
+        with self._cond:
+            self.text = text
+            self.edits += 1
+            self._changed()
+
+    def configure(self, source, target):
+        with self._cond:
+            if (source, target) != (self.source, self.target):
+                self.source, self.target = source, target
+                self._pushed = []
+                self._changed()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cancel_pass('live session closed')
+            self._cond.notify()
+
+    def _current(self, version):
+        return not self._closed and self._version == version
+
+    def _run(self):
+        handled = 0
+        while True:
+            with self._cond:
+                while not self._closed and self._version == handled:
+                    self._cond.wait()
+                # Debounce: wait until no edit has arrived for a while
+                while not self._closed:
+                    remaining = self._last_edit + self.debounce - time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                version, text = self._version, self.text
+                source, target = self.source, self.target
+                self._deadline = start_deadline(self.budget)
+            try:
+                self._translate_pass(version, text, source, target)
+            except Exception as e:
+                if self._current(version):
+                    self._send({'type': 'error', 'version': version, 'message': f"Translation failed: {str(e)}"})
+                else:
+                    # Cancelled by newer input, which gets a pass of its own
+                    self.superseded += 1
+            finally:
+                with self._cond:
+                    self._deadline = None
+                clear_deadline()
+            handled = version
+
+    def _translate_pass(self, version, text, source, target):
+        translated = []
+        for sentence in split_sentences(text):
+            key = (source, target, sentence)
+            if key not in self._cache:
+                if not self._current(version):
+                    # Newer input arrived: skip the sentences still queued in this pass
+                    self.superseded += 1
+                    return
+                if len(self._cache) >= MAX_CACHED_SENTENCES:
+                    self._cache.clear()
+                self._deadline.extend(self.budget)
+                self._cache[key] = self._translate(sentence, source, target)
+                self.upstream_calls += 1
+            translated.append(self._cache[key])
+
+        if not self._current(version):
+            self.superseded += 1
+            return
+        ops = [{'index': i, 'text': t} for i, t in enumerate(translated)
+               if i >= len(self._pushed) or self._pushed[i] != t]
+        self._pushed = translated
+        self._send({'type': 'diff', 'version': version, 'length': len(translated), 'ops': ops})
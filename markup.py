@@ -0,0 +1,287 @@
+import html
+import re
+from html.parser import HTMLParser
+
+from placeholders import contains_placeholder, placeholder, restore
+
+# Elements whose content is code or otherwise not prose
+_SKIP_TAGS = {'script', 'style', 'code', 'pre', 'kbd', 'samp', 'var', 'textarea', 'template', 'svg', 'math'}
+
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# Elements that sit inside a sentence. The text around them is sent upstream
+# as one item, with each of their tags (or a whole skipped element, such as
+# inline code) standing in as a {n} placeholder; any other tag ends the item.
+_INLINE_TAGS = {'a', 'abbr', 'b', 'bdi', 'bdo', 'br', 'cite', 'code', 'data', 'del', 'dfn', 'em', 'font', 'i',
+                'img', 'ins', 'kbd', 'mark', 'q', 's', 'samp', 'small', 'span', 'strong', 'sub', 'sup', 'time',
+                'u', 'var', 'wbr'}
+
+_BLOCK_TAGS = {'html', 'head', 'body', 'title', 'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li',
+               'dl', 'dt', 'dd', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th', 'caption', 'blockquote',
+               'section', 'article', 'header', 'footer', 'nav', 'main', 'aside', 'figure', 'figcaption', 'form',
+               'label', 'button', 'select', 'option', 'details', 'summary'}
+
+# Plain text counts as HTML only with a doctype, or with a well-known element
+# that is closed again later: "if x<y and z>w" is prose, not a <y> tag
+_DOCTYPE_RE = re.compile(r"<!doctype\s+html", re.I)
+_HTML_OPEN_TAG_RE = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)(?:\s[^<>]*)?>")
+
+# Markdown lines that are structure only: fences are handled separately
+_MD_SKIP_LINE_RE = re.compile(r"^\s{0,3}(?:\[[^\]]+\]:\s|\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)*\|?\s*$|(?:[-*_]\s*){3,}$)")
+
+# Block prefixes (headings, quotes, list bullets) and inline markup that must
+# not be sent upstream: code spans, link targets, images, HTML tags, autolinks
+# and emphasis markers become placeholders inside their block's text; table
+# pipes separate cells, which are translated on their own.
+_MD_PREFIX_RE = re.compile(r"^(?:\s*(?:#{1,6}\s+|>\s?|[-*+]\s+|\d+[.)]\s+|\[[ xX]\]\s+))*")
+_MD_INLINE_RE = re.compile(
+    r"`+[^`]*`+"
+    r"|\]\([^)]*\)|\]\[[^\]]*\]|\]"
+    r"|!?\["
+    r"|<[^>\n]+>"
+    r"|(?<!\w)(?:\*{1,3}|_{1,3}|~~)|(?:\*{1,3}|_{1,3}|~~)(?!\w)"
+    r"|\|"
+)
+
+
+class Segment:
+    """A run of translatable text at source[start:end]
+
+    Inline markup inside the run is replaced by {n} placeholders in text and
+    kept in markup. fragments are the plain text pieces between the markup,
+    translated one by one if a translation loses a placeholder.
+    """
+
+    def __init__(self, start, end, text, escape=False, markup=(), fragments=()):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.escape = escape
+        self.markup = list(markup)
+        self.fragments = list(fragments)
+
+    def render(self, translated):
+        """What replaces the segment in the source, or None if a placeholder was lost or duplicated"""
+        if self.escape:
+            translated = html.escape(translated, quote=False)
+        return restore(translated, self.markup)
+
+
+def detect_format(text):
+    """'html' when text is unmistakably HTML, else None
+
+    Markdown is never guessed: prose with asterisks or underscores looks the
+    same, so it has to be asked for explicitly.
+    """
+    if _DOCTYPE_RE.search(text):
+        return 'html'
+    known = _INLINE_TAGS | _BLOCK_TAGS | _SKIP_TAGS
+    for match in _HTML_OPEN_TAG_RE.finditer(text):
+        name = match.group(1).lower()
+        if name in known and re.search(rf"</{name}\s*>", text[match.end():], re.I):
+            return 'html'
+    return None
+
+
+def _trimmed(source, start, end, escape=False):
+    """Segment for source[start:end] without its surrounding whitespace, or None if blank"""
+    raw = source[start:end]
+    stripped = raw.strip()
+    if not stripped or not any(c.isalpha() for c in stripped):
+        return None
+    start += len(raw) - len(raw.lstrip())
+    end -= len(raw) - len(raw.rstrip())
+    text = source[start:end]
+    return Segment(start, end, html.unescape(text) if escape else text, escape)
+
+
+def _block_segments(source, pieces, escape=False):
+    """Segments for one block given as (start, end, kind) pieces
+
+    kind is 'text', 'markup' (sent as a placeholder) or 'break' (a soft line
+    break inside a paragraph, sent as a space).
+    """
+    while pieces and pieces[0][2] != 'markup' and not source[pieces[0][0]:pieces[0][1]].strip():
+        pieces = pieces[1:]
+    while pieces and pieces[-1][2] != 'markup' and not source[pieces[-1][0]:pieces[-1][1]].strip():
+        pieces = pieces[:-1]
+    fragments = [f for f in (_trimmed(source, start, end, escape) for start, end, kind in pieces if kind == 'text')
+                 if f is not None]
+    if not fragments:
+        return []
+    if all(kind == 'text' for _, _, kind in pieces) or any(contains_placeholder(f.text) for f in fragments):
+        # Nothing to keep in place, or text whose own {n} tokens would be mistaken for ours
+        return fragments
+
+    start, end = pieces[0][0], pieces[-1][1]
+    if pieces[0][2] == 'text':
+        raw = source[start:pieces[0][1]]
+        start += len(raw) - len(raw.lstrip())
+    if pieces[-1][2] == 'text':
+        raw = source[pieces[-1][0]:end]
+        end -= len(raw) - len(raw.rstrip())
+    parts = []
+    markup = []
+    for piece_start, piece_end, kind in pieces:
+        raw = source[max(piece_start, start):min(piece_end, end)]
+        if kind == 'markup':
+            parts.append(placeholder(len(markup)))
+            markup.append(raw)
+        elif kind == 'break':
+            parts.append(' ')
+        else:
+            parts.append(html.unescape(raw) if escape else raw)
+    return [Segment(start, end, ''.join(parts), escape, markup, fragments)]
+
+
+class _TextNodes(HTMLParser):
+    """Records where each text node and tag starts, and whether it can sit inside a sentence"""
+
+    def __init__(self, source):
+        super().__init__(convert_charrefs=True)
+        self._line_starts = [0] + [m.end() for m in re.finditer('\n', source)]
+        self.events = []  # (offset, kind): 'text', 'markup' (inline) or 'block'
+        self._skipping = []
+        self._inline_skip = False  # the outermost skipped element sits inside a sentence
+
+    def _offset(self):
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+
+    def _add(self, kind):
+        if self._skipping:
+            # Everything inside a skipped element belongs to one placeholder, or to no segment at all
+            kind = 'markup' if self._inline_skip else 'block'
+        self.events.append((self._offset(), kind))
+
+    @staticmethod
+    def _kind(tag):
+        return 'markup' if tag in _INLINE_TAGS else 'block'
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in _VOID_TAGS:
+            attrs = dict(attrs)
+            no_translate = attrs.get('translate') == 'no' or 'notranslate' in (attrs.get('class') or '').split()
+            if tag in _SKIP_TAGS or self._skipping or no_translate:
+                if not self._skipping:
+                    self._inline_skip = tag in _INLINE_TAGS
+                self._skipping.append(tag)
+        self._add(self._kind(tag))
+
+    def handle_startendtag(self, tag, attrs):
+        self._add(self._kind(tag))
+
+    def handle_endtag(self, tag):
+        self._add(self._kind(tag))
+        if tag in self._skipping:
+            # Unclosed elements inside the skipped one end with it
+            while self._skipping.pop() != tag:
+                pass
+
+    def handle_data(self, data):
+        self._add('text')
+
+    def handle_comment(self, data):
+        self._add('markup')
+
+    def handle_decl(self, decl):
+        self._add('block')
+
+    def handle_pi(self, data):
+        self._add('block')
+
+    def unknown_decl(self, data):
+        self._add('block')
+
+
+def html_segments(source):
+    """Translatable runs of an HTML document or fragment, one per block of text"""
+    parser = _TextNodes(source)
+    parser.feed(source)
+    parser.close()
+    events = parser.events + [(len(source), 'block')]
+
+    segments = []
+    pieces = []
+    for (start, kind), (end, _) in zip(events, events[1:]):
+        if kind == 'block':
+            segments.extend(_block_segments(source, pieces, escape=True))
+            pieces = []
+        elif pieces and pieces[-1][2] == kind and pieces[-1][1] == start:
+            # A stray '<' splits one text node into several data events
+            pieces[-1] = (pieces[-1][0], end, kind)
+        else:
+            pieces.append((start, end, kind))
+    segments.extend(_block_segments(source, pieces, escape=True))
+    return segments
+
+
+def markdown_segments(source):
+    """Translatable runs of a Markdown document, one per paragraph, heading, list item or table cell"""
+    segments = []
+    pieces = []
+    joinable = False  # the next plain line continues the current paragraph
+    in_fence = False
+    offset = 0
+    for line in source.splitlines(keepends=True):
+        line_start, offset = offset, offset + len(line)
+        body = line.rstrip('\r\n')
+        if body.lstrip().startswith(('```', '~~~')):
+            in_fence = not in_fence
+            body = ''
+        if in_fence or not body.strip() or _MD_SKIP_LINE_RE.match(body):
+            segments.extend(_block_segments(source, pieces))
+            pieces, joinable = [], False
+            continue
+        position = _MD_PREFIX_RE.match(body).end()
+        if position or '|' in body or not joinable:
+            segments.extend(_block_segments(source, pieces))
+            pieces = []
+        else:
+            pieces.append((pieces[-1][1], line_start, 'break'))
+        # Headings and table rows are one line each
+        joinable = not body.lstrip().startswith('#') and '|' not in body
+        for match in _MD_INLINE_RE.finditer(body, position):
+            pieces.append((line_start + position, line_start + match.start(), 'text'))
+            if match.group(0) == '|':
+                segments.extend(_block_segments(source, pieces))
+                pieces = []
+            else:
+                pieces.append((line_start + match.start(), line_start + match.end(), 'markup'))
+            position = match.end()
+        pieces.append((line_start + position, line_start + len(body), 'text'))
+    segments.extend(_block_segments(source, pieces))
+    return segments
+
+
+def reinject(source, segments, translations):
+    """source with each segment replaced by its rendered translation; everything else is untouched"""
+    parts = []
+    position = 0
+    for segment, translated in zip(segments, translations):
+        parts.append(source[position:segment.start])
+        parts.append(segment.render(translated))
+        position = segment.end
+    parts.append(source[position:])
+    return ''.join(parts)
+
+
+def translate_markup(source, fmt, translate_many, source_lang, target_lang):
+    """Translate only the text of an HTML or Markdown document, batching all its text runs"""
+    segments = html_segments(source) if fmt == 'html' else markdown_segments(source)
+    if not segments:
+        return source
+    translations = translate_many([segment.text for segment in segments], source_lang, target_lang)
+
+    done = []
+    retry = []
+    for segment, translated in zip(segments, translations):
+        if segment.render(translated) is None:
+            # The provider dropped or duplicated a placeholder: translate the pieces around the markup instead
+            retry.extend(segment.fragments)
+        else:
+            done.append((segment, translated))
+    if retry:
+        done.extend(zip(retry, translate_many([fragment.text for fragment in retry], source_lang, target_lang)))
+    done.sort(key=lambda item: item[0].start)
+    return reinject(source, [segment for segment, _ in done], [translated for _, translated in done])
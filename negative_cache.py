@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+from resilience import Cancelled, CircuitOpenError, DeadlineExceeded
+from translation_memory import mask_variables
+
+# Seconds to remember each kind of failure: an empty result or a request the
+# provider rejects as invalid will not change soon, an upstream error might
+DEFAULT_TTLS = {'empty': 300.0, 'unsupported': 3600.0, 'rate_limited': 10.0, 'upstream_error': 15.0}
+
+# Provider client exceptions (deep_translator's among them) by class name, so
+# classifying an error never needs to import the client library. Only the
+# client's own rejections count: a generic ValueError or KeyError is as likely
+# a malformed response (requests' JSONDecodeError is a ValueError) as bad input.
+_UNSUPPORTED = {'LanguageNotSupportedException', 'InvalidSourceOrTargetLanguage', 'NotValidPayload',
+                'NotValidLength'}
+_EMPTY = {'TranslationNotFound'}
+_RATE_LIMITED = {'TooManyRequests'}
+
+
+class CachedFailure(Exception):
+    """The same translation failed a moment ago and is not retried until its entry expires"""
+
+
+def parse_ttls(spec):
+    """TTLs from a spec such as "empty=300,upstream_error=15"; unlisted kinds keep their defaults"""
+    ttls = dict(DEFAULT_TTLS)
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        kind, _, seconds = item.partition('=')
+        if kind.strip() not in ttls:
+            raise ValueError(f"Unknown negative cache entry kind: {kind}")
+        ttls[kind.strip()] = float(seconds)
+    return ttls
+
+
+def classify(error):
+    """Kind of negative cache entry for an upstream error, or None if it should not be remembered
+
+    Timeouts, open circuits and cancellations say nothing about the text
+    itself and are handled by the resilience layer instead.
+    """
+    if isinstance(error, (Cancelled, CircuitOpenError, DeadlineExceeded, CachedFailure)):
+        return None
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & _EMPTY:
+        return 'empty'
+    if names & _RATE_LIMITED:
+        return 'rate_limited'
+    if names & _UNSUPPORTED:
+        return 'unsupported'
+    return 'upstream_error'
+
+
+class NegativeCache:
+    """Short-lived memory of translations that failed or came back empty
+
+    Entries are keyed like the translation memory, by language pair and
+    variable-masked template, and expire after the TTL of their kind (a
+    TTL of 0 turns a kind off). Retrying a known failure answers from here
+    without an upstream call. When a pair's circuit closes again after an
+    outage, the pair's entries are dropped so the next request goes upstream.
+    """
+
+    def __init__(self, ttls=None, capacity=10000):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.capacity = capacity
+        self._entries = OrderedDict()  # (pair, template) -> (expires, kind, message)
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(self.ttls, 0)
+        self.stored = dict.fromkeys(self.ttls, 0)
+        self.chars_avoided = 0
+        self.cleared = 0
+
+    def _store(self, text, source, target, kind, message):
+        ttl = self.ttls.get(kind, 0)
+        if ttl <= 0:
+            return
+        key = ((source, target), mask_variables(text)[0])
+        with self._lock:
+            self._entries[key] = (monotonic() + ttl, kind, message)
+            self._entries.move_to_end(key)
+            self.stored[kind] += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def add_failure(self, text, source, target, error):
+        """Remember that translating text failed with error, if the error is worth remembering"""
+        kind = classify(error)
+        if kind is not None:
+            self._store(text, source, target, kind, str(error))
+
+    def add_empty(self, text, source, target):
+        """Remember that the provider had no translation for text"""
+        self._store(text, source, target, 'empty', None)
+
+    def lookup(self, text, source, target, failures=True):
+        """'' for a known empty result, None if nothing is known; raises CachedFailure for a known failure
+
+        With failures=False only empty results are reported.
+        """
+        key = ((source, target), mask_variables(text)[0])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, kind, message = entry
+            if expires <= monotonic():
+                del self._entries[key]
+                return None
+            if kind != 'empty' and not failures:
+                return None
+            self.hits[kind] += 1
+            self.chars_avoided += len(text)
+        if kind == 'empty':
+            return ''
+        raise CachedFailure(message)
+
+    def clear_pair(self, pair):
+        """Forget everything about a language pair given as "source-target" """
+        with self._lock:
+            stale = [key for key in self._entries if f"{key[0][0]}-{key[0][1]}" == pair]
+            for key in stale:
+                del self._entries[key]
+            self.cleared += len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'stored': dict(self.stored),
+                'hits': dict(self.hits),
+                'chars_avoided': self.chars_avoided,
+                'cleared_on_recovery': self.cleared,
+            }
@@ -0,0 +1,106 @@
+import re
+from collections import Counter
+
+# Provider limit per request (GoogleTranslator rejects longer payloads)
+MAX_REQUEST_CHARS = 5000
+
+# Items are joined with numbered marker lines. Numbering lets us tell exactly
+# which items are affected when the provider drops or mangles a delimiter.
+_MARKER_RE = re.compile(r"\[\[\s*(\d+)\s*\]\]")
+
+
+def _marker(index):
+    return f"[[{index}]]"
+
+
+def cost(index, text):
+    """Characters an item adds to a packed payload, delimiter included"""
+    return len(_marker(index)) + 2 + len(text)
+
+
+def pack(texts, limit=MAX_REQUEST_CHARS):
+    """Group item indices into batches whose joined payload fits within limit
+
+    Empty items are skipped. Items that are too long to share a request, or
+    that contain marker-like text, are returned as single-item batches.
+    """
+    batch = []
+    size = 0
+    for index, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        size_needed = cost(index, text)
+        if size_needed > limit or _MARKER_RE.search(text):
+            yield [index]
+            continue
+        if batch and size + size_needed > limit:
+            yield batch
+            batch, size = [], 0
+        batch.append(index)
+        size += size_needed
+    if batch:
+        yield batch
+
+
+def join(texts, indices):
+    """Build the upstream payload for one batch"""
+    return '\n'.join(f"{_marker(i)}\n{texts[i]}" for i in indices)
+
+
+def split(translated, indices):
+    """Map a translated payload back to items
+
+    Returns a dict of index -> translation for every item whose delimiters
+    survived intact; items missing from the dict need an individual retry.
+    """
+    following = dict(zip(indices, indices[1:] + [None]))
+    markers = [(int(m.group(1)), m.start(), m.end()) for m in _MARKER_RE.finditer(translated)]
+    seen = Counter(idx for idx, _, _ in markers)
+
+    results = {}
+    for pos, (idx, _, end) in enumerate(markers):
+        if idx not in following or seen[idx] != 1:
+            continue
+        next_idx, next_start = (markers[pos + 1][:2] if pos + 1 < len(markers)
+                                else (None, len(translated)))
+        if next_idx != following[idx]:
+            # The next item's marker went missing, so this segment may hold both
+            continue
+        segment = translated[end:next_start].strip()
+        if segment:
+            results[idx] = segment
+    return results
+
+
+def translate_packed(texts, translate, limit=MAX_REQUEST_CHARS, stats=None):
+    """Translate many short texts with as few calls to translate(text) as possible
+
+    Returns translations in input order. Items whose delimiters were corrupted
+    upstream fall back to one call each; other items in the batch are kept.
+    """
+    texts = list(texts)
+    results = list(texts)
+    calls = fallbacks = 0
+
+    for indices in pack(texts, limit):
+        if len(indices) == 1:
+            results[indices[0]] = translate(texts[indices[0]])
+            calls += 1
+            continue
+
+        translated = translate(join(texts, indices))
+        calls += 1
+        recovered = split(translated or '', indices)
+        for index in indices:
+            if index in recovered:
+                results[index] = recovered[index]
+            else:
+                results[index] = translate(texts[index])
+                calls += 1
+                fallbacks += 1
+
+    if stats is not None:
+        stats['items'] = stats.get('items', 0) + len(texts)
+        stats['calls'] = stats.get('calls', 0) + calls
+        stats['fallbacks'] = stats.get('fallbacks', 0) + fallbacks
+    return results
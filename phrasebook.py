@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import threading
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """Phrasebook key for text: case-folded, with runs of whitespace collapsed"""
+    return ' '.join(text.split()).casefold()
+
+
+class Phrasebook:
+    """Curated translations of the most frequent phrases, answered without going upstream
+
+    Each file in directory is named after its language pair, such as
+    en-fr.json, and holds {"version": "...", "phrases": {"Hello": "Bonjour"}}.
+    Lookups are a dict access on the normalized text, so "hello  world" and
+    "Hello World" match the same entry. Auto-detected sources use the
+    target's phrasebooks that agree on the phrase. The directory is checked
+    for changed files at most every check_interval seconds and changed books
+    are reloaded in place; a file that fails to load keeps its previous
+    contents.
+    """
+
+    def __init__(self, directory, check_interval=5.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._books = {}  # (source, target) -> {'version': ..., 'phrases': {key: translation}}
+        self._auto = {}  # target -> {key: translation} agreed by all its sources
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.chars_avoided = 0
+        self.reloads = 0
+        self.reload()
+
+    def _scan(self):
+        """{(source, target): (path, mtime_ns, size)} for the phrasebook files present now"""
+        files = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return files
+        for entry in entries:
+            name, ext = os.path.splitext(entry.name)
+            source, sep, target = name.partition('-')
+            # zh-CN and friends: the target is whatever follows the first dash
+            if ext != '.json' or not sep or not entry.is_file():
+                continue
+            stat = entry.stat()
+            files[(source, target)] = (entry.path, stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _load(self, path):
+        with open(path, encoding='utf-8') as f:
+            book = json.load(f)
+        phrases = book['phrases']
+        if not isinstance(phrases, dict):
+            raise ValueError("'phrases' must be an object")
+        return {
+            'version': str(book.get('version', '')),
+            'phrases': {normalize(k): v for k, v in phrases.items()
+                        if isinstance(k, str) and isinstance(v, str) and k.strip() and v.strip()},
+        }
+
+    def reload(self):
+        """Load phrasebooks that were added or changed since the last check and drop removed ones"""
+        with self._lock:
+            self._next_check = monotonic() + self.check_interval
+            files = self._scan()
+            if files == self._signature:
+                return False
+            previous = self._signature or {}
+            books = {}
+            for pair, stamp in files.items():
+                if pair in self._books and previous.get(pair) == stamp:
+                    books[pair] = self._books[pair]
+                    continue
+                try:
+                    books[pair] = self._load(stamp[0])
+                    logger.info(f"Loaded phrasebook {pair[0]}-{pair[1]} version "
+                                f"{books[pair]['version'] or '?'} ({len(books[pair]['phrases'])} phrases)")
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Could not load phrasebook {stamp[0]}: {e}")
+                    if pair in self._books:
+                        books[pair] = self._books[pair]
+            auto = {}
+            conflicts = set()
+            for (source, target), book in books.items():
+                merged = auto.setdefault(target, {})
+                for key, translation in book['phrases'].items():
+                    if merged.setdefault(key, translation) != translation:
+                        conflicts.add((target, key))
+            for target, key in conflicts:
+                del auto[target][key]
+            # Swapped in whole, so lookups never see a half-loaded phrasebook
+            self._books, self._auto, self._signature = books, auto, files
+            self.reloads += 1
+            return True
+
+    def lookup(self, text, source, target):
+        """The curated translation of text, or None"""
+        if monotonic() >= self._next_check:
+            self._next_check = monotonic() + self.check_interval
+            self.reload()
+        if source == 'auto':
+            phrases = self._auto.get(target)
+        else:
+            book = self._books.get((source, target))
+            phrases = book['phrases'] if book is not None else None
+        if not phrases:
+            return None
+        result = phrases.get(normalize(text))
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+                self.chars_avoided += len(text)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'books': {f"{source}-{target}": {'version': book['version'], 'phrases': len(book['phrases'])}
+                          for (source, target), book in sorted(self._books.items())},
+                'hits': self.hits,
+                'chars_avoided': self.chars_avoided,
+                'reloads': self.reloads,
+            }
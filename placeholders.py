@@ -0,0 +1,64 @@
+import re
+
+# Spans the provider must not translate. Code, URLs and e-mail addresses are
+# always protected; numbers and emoji only when the placeholder is shorter.
+_PROTECTED_RE = re.compile(
+    r"(?P<code>`[^`\n]+`)"
+    r"|(?P<url>\b(?:https?://|www\.)[^\s<>\"'`]*[^\s<>\"'`.,;:!?)\]}])"
+    r"|(?P<email>\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+)"
+    r"|(?P<number>\d+(?:[.,:/-]\d+)*)"
+    r"|(?P<emoji>[\U0001F000-\U0001FAFF\u2600-\u27BF][\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]*)"
+)
+_ALWAYS_PROTECT = {'code', 'url', 'email'}
+
+# Placeholders look like {0}; providers sometimes pad them with spaces
+_PLACEHOLDER_RE = re.compile(r"\{\s*(\d+)\s*\}")
+
+
+def placeholder(index):
+    return '{' + str(index) + '}'
+
+
+def contains_placeholder(text):
+    """True when text already has placeholder-like tokens of its own"""
+    return _PLACEHOLDER_RE.search(text) is not None
+
+
+def protect(text):
+    """Replace untranslatable spans with compact placeholders
+
+    Returns the masked text and the list of original spans, indexed by
+    placeholder number. Text that already contains placeholder-like tokens
+    is returned unchanged so restoring can never be ambiguous.
+    """
+    if contains_placeholder(text):
+        return text, []
+
+    spans = []
+
+    def replace(match):
+        value = match.group(0)
+        token = placeholder(len(spans))
+        if match.lastgroup not in _ALWAYS_PROTECT and len(token) >= len(value):
+            return value
+        spans.append(value)
+        return token
+
+    masked = _PROTECTED_RE.sub(replace, text)
+    return masked, spans
+
+
+def restore(translated, spans):
+    """Put the original spans back, or return None if any placeholder was lost or duplicated"""
+    if not spans:
+        return translated
+
+    found = [int(m.group(1)) for m in _PLACEHOLDER_RE.finditer(translated)]
+    if sorted(found) != list(range(len(spans))):
+        return None
+    return _PLACEHOLDER_RE.sub(lambda m: spans[int(m.group(1))], translated)
+
+
+def is_placeholder_only(masked):
+    """True when nothing translatable is left once placeholders are removed"""
+    return not any(ch.isalpha() for ch in _PLACEHOLDER_RE.sub('', masked))
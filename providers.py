@@ -0,0 +1,233 @@
+import random
+import threading
+from functools import cached_property
+from time import monotonic, sleep
+
+from resilience import Cancelled, CircuitOpenError, DeadlineExceeded, current_deadline
+
+
+# deep_translator (with requests and BeautifulSoup) is imported on first use:
+# it is the slowest part of startup, and local providers never need it
+
+
+class GoogleProvider:
+    name = 'google'
+    char_limit = 5000
+
+    @cached_property
+    def codes(self):
+        from deep_translator.constants import GOOGLE_LANGUAGES_TO_CODES
+        return set(GOOGLE_LANGUAGES_TO_CODES.values())
+
+    def supports(self, source, target):
+        return (source == 'auto' or source in self.codes) and target in self.codes
+
+    def translate(self, text, source, target):
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator(source=source, target=target).translate(text)
+
+
+class MyMemoryProvider:
+    """MyMemory wants regional codes (fr-FR) and cannot auto-detect"""
+
+    name = 'mymemory'
+    char_limit = 500
+
+    @cached_property
+    def _codes(self):
+        from deep_translator.constants import MY_MEMORY_LANGUAGES_TO_CODES
+        codes = {}
+        for code in MY_MEMORY_LANGUAGES_TO_CODES.values():
+            codes.setdefault(code.split('-')[0], code)
+            codes.setdefault(code, code)
+        return codes
+
+    def supports(self, source, target):
+        return source in self._codes and target in self._codes
+
+    def translate(self, text, source, target):
+        from deep_translator import MyMemoryTranslator
+        return MyMemoryTranslator(source=self._codes[source], target=self._codes[target]).translate(text)
+
+
+class DeeplProvider:
+    name = 'deepl'
+    char_limit = 5000
+    codes = {'en', 'de', 'fr', 'es', 'it', 'ja', 'ko', 'ru', 'zh', 'ar'}
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def _code(self, lang):
+        return 'zh' if lang == 'zh-CN' else lang
+
+    def supports(self, source, target):
+        return (source == 'auto' or self._code(source) in self.codes) and self._code(target) in self.codes
+
+    def translate(self, text, source, target):
+        from deep_translator import DeeplTranslator
+        return DeeplTranslator(api_key=self.api_key, source=self._code(source),
+                               target=self._code(target)).translate(text)
+
+
+class LocalProvider:
+    """Offline stand-in with a configurable latency and failure profile
+
+    Tags every line that has something to translate with the target
+    language, e.g. "[fr] hello", so packed items come back visibly
+    translated and their delimiter lines intact.
+    """
+
+    def __init__(self, name, latency=0.05, jitter=0.0, error_rate=0.0, char_limit=5000):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.char_limit = char_limit
+
+    def supports(self, source, target):
+        return True
+
+    def translate(self, text, source, target):
+        sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.error_rate:
+            raise ConnectionError(f"{self.name}: injected failure")
+        return '\n'.join(f"[{target}] {line}" if any(c.isalpha() for c in line) else line
+                         for line in text.split('\n'))
+
+
+def providers_from_spec(spec, deepl_key=None):
+    """Build providers from a comma-separated list such as "google,mymemory"
+
+    Local stand-ins take the form local:<name>:<latency seconds>[:<error rate>].
+    """
+    providers = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        if item == 'google':
+            providers.append(GoogleProvider())
+        elif item == 'mymemory':
+            providers.append(MyMemoryProvider())
+        elif item == 'deepl':
+            if not deepl_key:
+                raise ValueError("The deepl provider needs DEEPL_API_KEY")
+            providers.append(DeeplProvider(deepl_key))
+        elif item.startswith('local'):
+            parts = item.split(':')
+            defaults = ['local', 'local', '0.05', '0']
+            _, name, latency, error_rate = parts + defaults[len(parts):]
+            providers.append(LocalProvider(name, latency=float(latency), error_rate=float(error_rate)))
+        else:
+            raise ValueError(f"Unknown translation provider: {item}")
+    return providers
+
+
+class _Health:
+    def __init__(self):
+        self.latency = None  # EWMA of successful call latency, seconds
+        self.error_rate = 0.0  # EWMA of failures (1) vs successes (0)
+        self.calls = 0
+
+
+class ProviderRouter:
+    """Send each translation to the fastest healthy provider for its language pair
+
+    Latency and error rate are tracked as EWMAs per provider and pair. A
+    provider is skipped while its circuit is open, or when the text is over
+    its character limit. Errors fail over to the next candidate while the
+    request still has time left. A small share of traffic goes to a random
+    candidate so that stale estimates get refreshed.
+    """
+
+    def __init__(self, providers, resilience, alpha=0.2, explore=0.05):
+        self.providers = list(providers)
+        self.resilience = resilience
+        self.alpha = alpha
+        self.explore = explore
+        self._health = {}
+        self._lock = threading.Lock()
+        self.failovers = 0
+
+    def _get(self, name, pair):
+        return self._health.setdefault((name, pair), _Health())
+
+    def _score(self, name, pair):
+        with self._lock:
+            health = self._get(name, pair)
+            # Untried providers score 0 so each gets measured at least once
+            latency = health.latency or 0.0
+            penalty = 1000.0 if health.error_rate > 0.5 else 0.0
+            return latency * (1 + 4 * health.error_rate) + penalty
+
+    def _record(self, name, pair, latency):
+        with self._lock:
+            health = self._get(name, pair)
+            health.calls += 1
+            failed = latency is None
+            health.error_rate += self.alpha * ((1.0 if failed else 0.0) - health.error_rate)
+            if not failed:
+                health.latency = latency if health.latency is None else \
+                    health.latency + self.alpha * (latency - health.latency)
+
+    def candidates(self, text, source, target):
+        """Providers able to take this request, best first"""
+        pair = f"{source}-{target}"
+        usable = [p for p in self.providers if p.supports(source, target) and len(text) <= p.char_limit]
+        ranked = sorted(usable, key=lambda p: self._score(p.name, pair))
+        if len(ranked) > 1 and random.random() < self.explore:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    def char_limit(self, source, target):
+        """Longest text one request for the pair can carry: the largest limit among its available providers"""
+        pair = f"{source}-{target}"
+        supporting = [p for p in self.providers if p.supports(source, target)]
+        available = [p for p in supporting if self.resilience.breaker(p.name, pair).state != 'open']
+        return max((p.char_limit for p in available or supporting), default=0)
+
+    def translate(self, text, source, target):
+        pair = f"{source}-{target}"
+        ranked = self.candidates(text, source, target)
+        if not ranked:
+            raise ValueError(f"No translation provider supports {pair} for {len(text)} characters")
+
+        error = None
+        for provider in ranked:
+            if self.resilience.breaker(provider.name, pair).state == 'open':
+                continue
+            started = monotonic()
+            try:
+                result = self.resilience.call(
+                    provider.name, pair, lambda p=provider: p.translate(text, source, target), cost=len(text)
+                )
+            except CircuitOpenError as e:
+                error = e
+                continue
+            except Cancelled:
+                raise
+            except Exception as e:
+                self._record(provider.name, pair, None)
+                error = e
+                deadline = current_deadline()
+                if isinstance(e, DeadlineExceeded) and deadline is not None and deadline.expired():
+                    raise
+                with self._lock:
+                    self.failovers += 1
+                continue
+            self._record(provider.name, pair, monotonic() - started)
+            return result
+
+        raise error or CircuitOpenError("All translation providers are temporarily unavailable")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'failovers': self.failovers,
+                'providers': {
+                    f"{name}:{pair}": {
+                        'latency_ms': round(h.latency * 1000, 1) if h.latency is not None else None,
+                        'error_rate': round(h.error_rate, 3),
+                        'calls': h.calls,
+                    }
+                    for (name, pair), h in self._health.items()
+                },
+            }
@@ -0,0 +1,347 @@
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import monotonic
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before the upstream call finished"""
+
+
+class CircuitOpenError(Exception):
+    """The backend is failing; the call was rejected without trying it"""
+
+
+class Cancelled(Exception):
+    """Nobody is waiting for the result any more, for instance because the client disconnected"""
+
+
+# How often waits for slots and results look for a cancelled request
+CANCEL_POLL_SECONDS = 0.1
+
+
+class Deadline:
+    """Absolute point in time by which a request must be answered
+
+    A request can also be cancelled before then; upstream calls made on its
+    behalf check for that and stop waiting.
+    """
+
+    def __init__(self, budget):
+        self.expires = monotonic() + budget
+        self.cancel_reason = None
+
+    def remaining(self):
+        return max(0.0, self.expires - monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def extend(self, budget):
+        """Give the request a fresh budget from now, e.g. for each chunk of a long streamed response"""
+        self.expires = monotonic() + budget
+
+    def cancel(self, reason):
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+
+    def cancelled(self):
+        return self.cancel_reason is not None
+
+
+# Deadline of the request being served on this thread, if any
+_current_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+def start_deadline(budget):
+    """Give the request being served on this thread a time budget"""
+    deadline = Deadline(budget)
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def clear_deadline():
+    _current_deadline.set(None)
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+class CircuitBreaker:
+    """Per-backend failure detector
+
+    Opens when at least failure_rate of the last window calls failed (once
+    min_calls have been seen), rejects calls for open_seconds, then lets a
+    single trial call through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_rate=0.5, window=20, min_calls=10, open_seconds=30):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if monotonic() - self._opened_at >= self.open_seconds:
+            return 'half-open'
+        return 'open'
+
+    def on_close(self, listener):
+        """Call listener() whenever the circuit closes again after being open"""
+        self._listeners.append(listener)
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._outcomes.append(True)
+            was_open = self._opened_at is not None
+            self._opened_at = None
+            self._trial_running = False
+        if was_open:
+            for listener in self._listeners:
+                listener()
+
+    def release_trial(self):
+        """Give up a half-open circuit's trial call without an outcome, so another call can try"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            if self._trial_running:
+                # The trial call failed: stay open for another period
+                self._opened_at = monotonic()
+                self._trial_running = False
+                return
+            failures = self._outcomes.count(False)
+            if (self._opened_at is None and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._opened_at = monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of call latencies for percentile estimates"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p, min_samples=20):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class Resilience:
+    """Deadlines, circuit breakers and optional hedging for upstream calls
+
+    Calls run on a dedicated pool so the caller can stop waiting when its
+    deadline passes or its request is cancelled; copies of the call that
+    have not started by then are taken off the pool. With hedging on, a duplicate is sent once a call has
+    taken longer than that backend's p95 latency and the first answer wins.
+    With a scheduler (see scheduler.py), each call first waits for one of its
+    slots, and the slot is held until every copy of the call has finished.
+    """
+
+    def __init__(self, call_timeout=8.0, hedge=False, max_workers=32, breaker_options=None, scheduler=None):
+        self.call_timeout = call_timeout
+        self.hedge = hedge
+        self.scheduler = scheduler
+        self.breaker_options = breaker_options or {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upstream')
+        self._breakers = {}
+        self._latency = {}
+        self._running = {}  # scheduler slot release -> copies of the call still running
+        self._close_listeners = []
+        self._lock = threading.Lock()
+        self.timeouts = 0
+        self.rejected = 0
+        self.hedged = 0
+        # Work saved by giving up on abandoned requests, and work that could not be stopped
+        self.cancellation = {'skipped': 0, 'dequeued': 0, 'chars_saved': 0, 'abandoned': 0}
+
+    def breaker(self, backend, key):
+        with self._lock:
+            if (backend, key) not in self._breakers:
+                breaker = CircuitBreaker(**self.breaker_options)
+                for listener in self._close_listeners:
+                    breaker.on_close(lambda listener=listener: listener(backend, key))
+                self._breakers[(backend, key)] = breaker
+            return self._breakers[(backend, key)]
+
+    def on_circuit_close(self, listener):
+        """Call listener(backend, key) whenever one of the circuits closes again after being open"""
+        with self._lock:
+            self._close_listeners.append(listener)
+            breakers = list(self._breakers.items())
+        for (backend, key), breaker in breakers:
+            breaker.on_close(lambda backend=backend, key=key: listener(backend, key))
+
+    def latency(self, backend):
+        with self._lock:
+            return self._latency.setdefault(backend, LatencyTracker())
+
+    def call(self, backend, key, fn, cost=1):
+        """Run fn() for backend/key within the current deadline, guarded by its circuit breaker
+
+        cost (such as the number of characters sent) orders calls waiting for a scheduler slot.
+        """
+        breaker = self.breaker(backend, key)
+        deadline = current_deadline()
+        self._check_cancelled(deadline, cost)
+        if breaker.state == 'open':
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError(f"{backend} is temporarily unavailable, please retry shortly")
+
+        timeout = self.call_timeout if deadline is None else min(self.call_timeout, deadline.remaining())
+        if timeout <= 0:
+            with self._lock:
+                self.timeouts += 1
+            raise DeadlineExceeded(f"No time left to call {backend}")
+
+        started = monotonic()
+        release = None
+        if self.scheduler is not None:
+            release = self.scheduler.acquire(cost, timeout, deadline.cancelled if deadline is not None else None)
+            if release is None:
+                self._check_cancelled(deadline, cost)
+                with self._lock:
+                    self.timeouts += 1
+                raise DeadlineExceeded(f"No time left to call {backend}: all upstream slots are busy")
+            # Time spent queueing comes out of the call's own timeout
+            timeout -= monotonic() - started
+            started = monotonic()
+
+        # Checked last, as it lets a single trial call through a half-open circuit
+        if not breaker.allow():
+            if release is not None:
+                release()
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError(f"{backend} is temporarily unavailable, please retry shortly")
+
+        tracker = self.latency(backend)
+        futures = {self._submit(fn, release)}
+        hedge_after = tracker.percentile(0.95) if self.hedge else None
+
+        try:
+            if hedge_after is not None and hedge_after < timeout:
+                done, _ = wait(futures, timeout=hedge_after)
+                if not done:
+                    with self._lock:
+                        self.hedged += 1
+                    futures.add(self._submit(fn, release))
+            result = self._first_result(futures, started + timeout, deadline)
+        except Cancelled:
+            self._abandon(futures, cost)
+            # The backend did nothing wrong; free a half-open circuit's trial for another call
+            breaker.release_trial()
+            raise
+        except DeadlineExceeded:
+            self._abandon(futures, cost)
+            breaker.record_failure()
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        tracker.record(monotonic() - started)
+        breaker.record_success()
+        return result
+
+    def _submit(self, fn, release):
+        """Start fn() on the upstream pool; release() runs once no copy of the call is still running"""
+        future = self._executor.submit(fn)
+        if release is not None:
+            with self._lock:
+                self._running[release] = self._running.get(release, 0) + 1
+
+            def done(_):
+                with self._lock:
+                    self._running[release] -= 1
+                    finished = self._running[release] == 0
+                    if finished:
+                        del self._running[release]
+                if finished:
+                    release()
+
+            future.add_done_callback(done)
+        return future
+
+    def _check_cancelled(self, deadline, cost):
+        if deadline is not None and deadline.cancelled():
+            with self._lock:
+                self.cancellation['skipped'] += 1
+                self.cancellation['chars_saved'] += cost
+            raise Cancelled(f"Request cancelled: {deadline.cancel_reason}")
+
+    def _abandon(self, futures, cost):
+        """Take copies of a call nobody waits for off the pool; running ones cannot be stopped"""
+        for future in futures:
+            if future.cancel():
+                with self._lock:
+                    self.cancellation['dequeued'] += 1
+                    self.cancellation['chars_saved'] += cost
+            elif not future.done():
+                with self._lock:
+                    self.cancellation['abandoned'] += 1
+
+    def _first_result(self, futures, give_up_at, deadline=None):
+        """Result of the first future to succeed; re-raises the last error if all fail"""
+        pending = set(futures)
+        error = None
+        while pending:
+            remaining = give_up_at - monotonic()
+            done, pending = wait(pending, timeout=max(0.0, min(remaining, CANCEL_POLL_SECONDS)),
+                                 return_when=FIRST_COMPLETED)
+            if deadline is not None and deadline.cancelled() and not done:
+                raise Cancelled(f"Request cancelled: {deadline.cancel_reason}")
+            if not done:
+                if remaining > CANCEL_POLL_SECONDS:
+                    continue
+                raise DeadlineExceeded("Upstream call exceeded its deadline")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        with self._lock:
+            breakers = {f"{backend}:{key}": b.state for (backend, key), b in self._breakers.items()
+                        if b.state != 'closed'}
+            return {'timeouts': self.timeouts, 'rejected': self.rejected,
+                    'hedged': self.hedged, 'open_circuits': breakers,
+                    'cancellation': dict(self.cancellation)}
@@ -0,0 +1,135 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+from resilience import CANCEL_POLL_SECONDS, LatencyTracker
+
+# Lower classes go first; a waiter is promoted one class per aging period
+PRIORITY_CLASSES = ('interactive', 'batch', 'background')
+
+# Priority of the work being done on this thread; web requests are interactive
+_current_priority = contextvars.ContextVar('priority', default='interactive')
+
+
+def set_priority(name):
+    """Mark the work on this thread as interactive, batch or background"""
+    if name not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class '{name}'")
+    _current_priority.set(name)
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+@contextmanager
+def priority(name):
+    """Run a block of work under another priority class"""
+    previous = current_priority()
+    set_priority(name)
+    try:
+        yield
+    finally:
+        _current_priority.set(previous)
+
+
+class _Waiter:
+    def __init__(self, rank, cost):
+        self.rank = rank
+        self.cost = cost
+        self.arrived = monotonic()
+        self.granted = False
+
+
+class PriorityScheduler:
+    """Hands out a fixed number of upstream call slots by priority and size
+
+    When a slot frees up it goes to the waiter with the lowest priority
+    class, and within a class to the cheapest (shortest) one, so one-word
+    lookups do not queue behind 5000-character documents. The last reserved
+    slots only go to interactive work, so a short request never has to wait
+    for a long one to finish. Every aging seconds spent waiting promotes a
+    waiter by one class, and equally ranked waiters are served oldest first,
+    so large and background work is delayed but never starved.
+    """
+
+    def __init__(self, slots=16, reserved=2, aging=2.0):
+        self.slots = slots
+        self.reserved = min(reserved, slots - 1)
+        self.aging = aging
+        self._active = 0
+        self._waiters = []
+        self._cond = threading.Condition()
+        self._waits = {name: LatencyTracker() for name in PRIORITY_CLASSES}
+        self._served = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.timeouts = 0
+
+    def _key(self, waiter, now):
+        rank = max(0, waiter.rank - int((now - waiter.arrived) / self.aging)) if self.aging else waiter.rank
+        return rank, waiter.cost, waiter.arrived
+
+    def _grant(self):
+        """Give free slots to the best-placed waiters; call with the lock held"""
+        now = monotonic()
+        for waiter in sorted(self._waiters, key=lambda w: self._key(w, now)):
+            rank = self._key(waiter, now)[0]
+            if self._active >= (self.slots if rank == 0 else self.slots - self.reserved):
+                break
+            self._waiters.remove(waiter)
+            waiter.granted = True
+            self._active += 1
+        self._cond.notify_all()
+
+    def acquire(self, cost=1, timeout=None, cancelled=None):
+        """Wait for a slot for work of the given cost; returns a function that releases it
+
+        Uses the priority class of the calling context. Returns None if no
+        slot was free within timeout seconds, or once cancelled() is true.
+        """
+        name = current_priority()
+        waiter = _Waiter(PRIORITY_CLASSES.index(name), cost)
+        give_up_at = None if timeout is None else waiter.arrived + timeout
+        with self._cond:
+            self._waiters.append(waiter)
+            self._grant()
+            while not waiter.granted:
+                remaining = None if give_up_at is None else give_up_at - monotonic()
+                if cancelled is not None and cancelled():
+                    self._waiters.remove(waiter)
+                    return None
+                if remaining is not None and remaining <= 0:
+                    self._waiters.remove(waiter)
+                    self.timeouts += 1
+                    return None
+                if cancelled is not None:
+                    remaining = CANCEL_POLL_SECONDS if remaining is None else min(remaining, CANCEL_POLL_SECONDS)
+                self._cond.wait(remaining)
+            self._served[name] += 1
+        self._waits[name].record(monotonic() - waiter.arrived)
+
+        released = []
+
+        def release():
+            if released:
+                return
+            released.append(True)
+            with self._cond:
+                self._active -= 1
+                self._grant()
+
+        return release
+
+    def stats(self):
+        with self._cond:
+            queued = dict.fromkeys(PRIORITY_CLASSES, 0)
+            for waiter in self._waiters:
+                queued[PRIORITY_CLASSES[waiter.rank]] += 1
+            stats = {'slots': self.slots, 'reserved': self.reserved, 'active': self._active, 'queued': queued,
+                     'served': dict(self._served), 'timeouts': self.timeouts}
+        wait_p99 = {}
+        for name, tracker in self._waits.items():
+            p99 = tracker.percentile(0.99)
+            wait_p99[name] = round(p99 * 1000, 1) if p99 is not None else None
+        stats['wait_p99_ms'] = wait_p99
+        return stats
@@ -0,0 +1,505 @@
+import contextvars
+import importlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from markup import detect_format, translate_markup
+from negative_cache import NegativeCache, parse_ttls
+from packing import MAX_REQUEST_CHARS, translate_packed
+from phrasebook import Phrasebook
+from placeholders import is_placeholder_only, protect, restore
+from providers import ProviderRouter, providers_from_spec
+from resilience import Cancelled, Resilience, clear_deadline, current_deadline, start_deadline
+from scheduler import PriorityScheduler, current_priority, priority
+from speech import AudioCache, SpeculativeSynthesizer, audio_id, synthesize, synthesize_parallel
+from translation_memory import TranslationMemory
+
+logger = logging.getLogger(__name__)
+
+# Deadline a service call started for itself because its caller had none
+_own_deadline = contextvars.ContextVar('service_deadline', default=None)
+
+# Registrations between scans of the shared audio ID directory for files to delete
+SPEECH_PRUNE_EVERY = 500
+
+# How sure langdetect must be before its guess replaces the provider's own
+# detection, and how many letters it needs to be trusted at all
+DETECT_MIN_PROBABILITY = 0.9
+DETECT_MIN_LETTERS = 20
+
+# langdetect codes that the providers spell differently
+_DETECTED_CODES = {'he': 'iw', 'zh-cn': 'zh-CN', 'zh-tw': 'zh-TW'}
+
+# Client libraries behind the providers and speech, loaded on first use
+BACKEND_MODULES = ('deep_translator', 'gtts', 'langdetect')
+
+
+def import_backends():
+    """Import the backend client libraries now rather than on the first call that needs them"""
+    for name in BACKEND_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def env_setting(name, default, prefix=''):
+    """Environment setting, preferring a bulkhead's own PREFIX_NAME over the shared NAME"""
+    return os.environ.get(f"{prefix}{name}", os.environ.get(name, default))
+
+
+def resilience_from_env(prefix=''):
+    """Deadlines, circuit breakers, hedging and upstream scheduling configured from the environment
+
+    Each Resilience is a bulkhead with its own upstream pool and slots; prefix
+    (such as 'SPEECH_') selects settings that apply to one bulkhead only.
+    """
+    slots = int(env_setting('UPSTREAM_CONCURRENCY', '16', prefix))
+    return Resilience(
+        call_timeout=float(env_setting('UPSTREAM_CALL_TIMEOUT', '8', prefix)),
+        hedge=env_setting('HEDGE_REQUESTS', '0', prefix) == '1',
+        # Room for a hedged copy of every call
+        max_workers=slots * 2,
+        scheduler=PriorityScheduler(
+            slots=slots,
+            reserved=int(env_setting('INTERACTIVE_RESERVED_SLOTS', '2', prefix)),
+            aging=float(env_setting('PRIORITY_AGING_SECONDS', '2', prefix)),
+        ),
+    )
+
+
+class _Service:
+    """Shared plumbing: a call budget and a pool for the async variants"""
+
+    def __init__(self, resilience, budget, max_workers, name):
+        self.resilience = resilience if resilience is not None else Resilience()
+        self.budget = budget
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    @contextmanager
+    def _budgeted(self):
+        """Run under the caller's deadline, or under budget seconds of the service's own
+
+        Yields the service's own deadline, which long calls renew between
+        upstream requests, or None when the caller's deadline applies.
+        """
+        if self.budget is None:
+            yield None
+            return
+        if current_deadline() is not None:
+            # Callers that already run under a deadline (such as web requests) keep theirs
+            own = _own_deadline.get()
+            yield own if own is current_deadline() else None
+            return
+        deadline = start_deadline(self.budget)
+        token = _own_deadline.set(deadline)
+        try:
+            yield deadline
+        finally:
+            _own_deadline.reset(token)
+            clear_deadline()
+
+    async def _run_async(self, fn, *args):
+        import asyncio
+        # The caller's context travels along so its deadline still applies
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, fn, *args)
+
+
+class TranslationService(_Service):
+    """Translation for in-process callers, without going through HTTP
+
+    Inputs are looked up in the curated phrasebook first, then in the
+    translation memory, then in the negative cache of recent failures and
+    empty results. Misses have URLs,
+    numbers and code swapped for placeholders, are packed into as few
+    upstream requests as possible, and are routed to the healthiest provider.
+    Each call gets budget seconds (batches: each upstream request) unless
+    the caller already has a deadline.
+    All methods are thread-safe; the *_async variants run on the service's
+    own pool.
+    """
+
+    def __init__(self, providers=None, resilience=None, memory=None, budget=10.0, max_workers=16,
+                 negative=None, phrasebook=None):
+        super().__init__(resilience, budget, max_workers, 'translation-service')
+        self.router = ProviderRouter(providers if providers is not None else providers_from_spec('google'),
+                                     self.resilience)
+        self.memory = memory if memory is not None else TranslationMemory()
+        self.negative = negative if negative is not None else NegativeCache()
+        self.phrasebook = phrasebook
+        # Once a pair's provider has recovered, its remembered failures are stale
+        self.resilience.on_circuit_close(lambda backend, pair: self.negative.clear_pair(pair))
+        self._lock = threading.Lock()
+        self._upstream = {'calls': 0, 'chars_sent': 0, 'chars_saved': 0, 'chars_cancelled': 0}
+        self._packing = {}
+
+    @classmethod
+    def from_env(cls, resilience=None):
+        """Service configured like the web app: TRANSLATION_PROVIDERS, DEEPL_API_KEY, TM_MIN_SIMILARITY,
+        TM_MAX_MB, NEGATIVE_CACHE_TTLS, PHRASEBOOK_DIR"""
+        return cls(
+            providers=providers_from_spec(os.environ.get('TRANSLATION_PROVIDERS', 'google'),
+                                          os.environ.get('DEEPL_API_KEY')),
+            resilience=resilience if resilience is not None else resilience_from_env(),
+            memory=TranslationMemory(min_similarity=float(os.environ.get('TM_MIN_SIMILARITY', '1.0')),
+                                     max_bytes=int(float(os.environ.get('TM_MAX_MB', '64')) * 2**20)),
+            budget=float(os.environ.get('REQUEST_BUDGET_SECONDS', '10')),
+            negative=NegativeCache(ttls=parse_ttls(os.environ.get('NEGATIVE_CACHE_TTLS'))),
+            phrasebook=Phrasebook(
+                os.environ.get('PHRASEBOOK_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'phrasebooks')),
+                check_interval=float(os.environ.get('PHRASEBOOK_CHECK_SECONDS', '5')),
+            ),
+        )
+
+    def _count_upstream(self, sent, saved):
+        with self._lock:
+            self._upstream['calls'] += 1 if sent else 0
+            self._upstream['chars_sent'] += sent
+            self._upstream['chars_saved'] += saved
+
+    def _upstream_translate(self, text, source, target):
+        """Translate with the best available provider, keeping untranslatable spans out of the payload"""
+        masked, spans = protect(text)
+        if spans and is_placeholder_only(masked):
+            # Nothing but URLs, numbers, code and emoji: no need to ask the provider
+            self._count_upstream(0, len(text))
+            return text
+
+        if spans:
+            restored = restore(self.router.translate(masked, source, target), spans)
+            saved = len(text) - len(masked)
+            if restored is not None:
+                self._count_upstream(len(masked), saved)
+                logger.info(f"Placeholder protection saved {saved} of {len(text)} upstream characters")
+                return restored
+            # The provider mangled a placeholder; exact round-tripping matters more than the savings
+            logger.warning("Placeholder round-trip failed, retranslating unprotected text")
+            self._count_upstream(len(masked), 0)
+
+        self._count_upstream(len(text), 0)
+        return self.router.translate(text, source, target)
+
+    def translate(self, text, source='auto', target='en'):
+        """Translate one text, reusing the phrasebook and translation memory before going upstream
+
+        Raises CachedFailure when the same text failed moments ago.
+        """
+        if self.phrasebook is not None:
+            result = self.phrasebook.lookup(text, source, target)
+            if result is not None:
+                return result
+        with self._budgeted():
+            result = self.memory.lookup(text, source, target)
+            if result is None:
+                result = self.negative.lookup(text, source, target)
+            if result is None:
+                try:
+                    result = self._upstream_translate(text, source, target)
+                except Exception as e:
+                    self.negative.add_failure(text, source, target, e)
+                    raise
+                if result and result.strip():
+                    self.memory.add(text, source, target, result)
+                else:
+                    self.negative.add_empty(text, source, target)
+            return result
+
+    def _lookup_local(self, text, source, target):
+        result = self.phrasebook.lookup(text, source, target) if self.phrasebook is not None else None
+        return result if result is not None else self.memory.lookup(text, source, target)
+
+    def translate_many(self, texts, source='auto', target='en'):
+        """Translate a list of texts, packing phrasebook and translation memory misses into few upstream calls
+
+        Texts that recently came back empty are answered from the negative
+        cache. A failed batch is not remembered, as it cannot be pinned on
+        any one text. Without a caller's deadline, each upstream request gets
+        budget seconds, so long batches are not cut off part way.
+        """
+        texts = list(texts)
+        with self._budgeted() as own:
+            results = [self._lookup_local(t, source, target) if t.strip() else t for t in texts]
+            for i, result in enumerate(results):
+                if result is None:
+                    results[i] = self.negative.lookup(texts[i], source, target, failures=False)
+            missing = [i for i, r in enumerate(results) if r is None]
+            stats = {}
+            sent = []
+
+            def send(chunk):
+                if own is not None:
+                    own.extend(self.budget)
+                sent.append(len(chunk))
+                return self._upstream_translate(chunk, source, target)
+
+            try:
+                # Packed no larger than the biggest request a provider for this pair accepts
+                translated = translate_packed([texts[i] for i in missing], send,
+                                              limit=self.router.char_limit(source, target) or MAX_REQUEST_CHARS,
+                                              stats=stats)
+            except Cancelled:
+                # Chunks that were never sent because nobody wanted the result any more
+                with self._lock:
+                    self._upstream['chars_cancelled'] += max(0, sum(len(texts[i]) for i in missing) - sum(sent))
+                raise
+        with self._lock:
+            for key, value in stats.items():
+                self._packing[key] = self._packing.get(key, 0) + value
+        for i, result in zip(missing, translated):
+            results[i] = result
+            if result and result.strip():
+                self.memory.add(texts[i], source, target, result)
+            else:
+                self.negative.add_empty(texts[i], source, target)
+        return results
+
+    def translate_document(self, text, source='auto', target='en', fmt=None):
+        """Translate HTML or Markdown text without sending its markup upstream
+
+        fmt is 'html', 'markdown' or 'text'. By default only unmistakable HTML
+        leaves plain-text mode; Markdown has to be asked for. Tags, attributes,
+        code and link targets come back byte-for-byte: inline markup travels
+        inside its sentence as {n} placeholders, each block of text is one
+        item, and all items share as few upstream calls as possible. Plain
+        text goes through translate().
+        """
+        fmt = fmt or detect_format(text) or 'text'
+        if fmt == 'text':
+            return self.translate(text, source, target)
+        with self._budgeted():
+            return translate_markup(text, fmt, self.translate_many, source, target)
+
+    def detect(self, text):
+        """Detect the source language locally when langdetect is installed, else leave it to the provider
+
+        Returns 'auto' for texts shorter than DETECT_MIN_LETTERS letters or
+        unless langdetect is at least DETECT_MIN_PROBABILITY sure, so short
+        or mixed texts are still detected by the provider.
+        Codes come back as the providers spell them (iw, zh-CN); callers
+        should still check that the code is supported.
+        """
+        try:
+            from langdetect import DetectorFactory, detect_langs
+        except ImportError:
+            return 'auto'
+        if sum(c.isalpha() for c in text) < DETECT_MIN_LETTERS:
+            return 'auto'
+        # Seeded, so the same text is always detected the same way
+        DetectorFactory.seed = 0
+        try:
+            best = max(detect_langs(text), key=lambda guess: guess.prob)
+        except Exception:
+            return 'auto'
+        if best.prob < DETECT_MIN_PROBABILITY:
+            return 'auto'
+        return _DETECTED_CODES.get(best.lang, best.lang)
+
+    async def translate_async(self, text, source='auto', target='en'):
+        return await self._run_async(self.translate, text, source, target)
+
+    async def translate_many_async(self, texts, source='auto', target='en'):
+        return await self._run_async(self.translate_many, list(texts), source, target)
+
+    async def translate_document_async(self, text, source='auto', target='en', fmt=None):
+        return await self._run_async(self.translate_document, text, source, target, fmt)
+
+    async def detect_async(self, text):
+        return await self._run_async(self.detect, text)
+
+    def stats(self):
+        with self._lock:
+            upstream = dict(self._upstream)
+            packing = dict(self._packing)
+        return {
+            'upstream': upstream,
+            'packing': packing,
+            'translation_memory': self.memory.stats(),
+            'negative_cache': self.negative.stats(),
+            'phrasebook': self.phrasebook.stats() if self.phrasebook is not None else None,
+            'routing': self.router.stats(),
+        }
+
+
+class SpeechService(_Service):
+    """Text-to-speech for in-process callers
+
+    Audio is content-addressed: audio_id(text, lang) names the MP3 for text,
+    and synthesized audio is kept in a byte-bounded cache. Long texts are
+    synthesized sentence by sentence in parallel. With speculative=True,
+    prepare() starts synthesis in the background before anyone asks. With a
+    directory, registered IDs are also written there as small JSON files, so
+    every process sharing the directory can serve them; the max_texts most
+    recently registered are kept.
+    """
+
+    def __init__(self, resilience=None, cache=None, speculative=False, budget=30.0,
+                 max_workers=8, max_texts=10000, start=True, directory=None):
+        super().__init__(resilience, budget, max_workers, 'speech-service')
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._registered = 0
+        # Segments wait for a thread before they reach the priority scheduler, so
+        # speculative synthesis gets threads of its own and never queues ahead of a
+        # request. Each pool has a thread for every scheduler slot its work may use.
+        scheduler = self.resilience.scheduler
+        slots = scheduler.slots if scheduler is not None else 8
+        background_slots = scheduler.slots - scheduler.reserved if scheduler is not None else slots // 2
+        self._segment_pool = ThreadPoolExecutor(max_workers=slots, thread_name_prefix='tts-segment')
+        self._background_segment_pool = ThreadPoolExecutor(max_workers=background_slots,
+                                                           thread_name_prefix='tts-background')
+        self.cache = cache if cache is not None else AudioCache()
+        self.speculative = SpeculativeSynthesizer(self.cache, synthesize=self._speculate, start=start) \
+            if speculative else None
+        self.max_texts = max_texts
+        self._texts = OrderedDict()  # audio id -> (text, lang)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, resilience=None, start=True):
+        """Service configured like the web app: SPECULATIVE_TTS=1 turns on background synthesis,
+        SPEECH_DIR holds the audio IDs shared by all workers
+
+        Without a resilience of its own, speech gets a separate bulkhead
+        configured by SPEECH_-prefixed settings.
+        """
+        return cls(
+            resilience=resilience if resilience is not None else resilience_from_env('SPEECH_'),
+            speculative=os.environ.get('SPECULATIVE_TTS') == '1',
+            start=start,
+            directory=os.environ.get('SPEECH_DIR',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'speech')),
+        )
+
+    def start(self):
+        """Start background synthesis threads if they were deferred"""
+        if self.speculative is not None:
+            self.speculative.start()
+
+    def _segment(self, text, lang):
+        """One gTTS synthesis, under the same deadline and circuit breaker rules as translation"""
+        return self.resilience.call('gtts', lang, lambda: synthesize(text, lang), cost=len(text))
+
+    def _synthesize(self, text, lang):
+        pool = self._background_segment_pool if current_priority() == 'background' else self._segment_pool
+        return synthesize_parallel(text, lang, pool, cache=self.cache, synthesize=self._segment)
+
+    def _speculate(self, text, lang):
+        # Nobody is waiting for speculative audio yet, so it yields to requests that are
+        with priority('background'):
+            return self._synthesize(text, lang)
+
+    def synthesize(self, text, lang='en'):
+        """MP3 bytes for text spoken in lang (a gTTS language code), from the cache when possible"""
+        key = audio_id(text, lang)
+        data = self.cache.get(key)
+        if data is None:
+            with self._budgeted():
+                data = self._synthesize(text, lang)
+            self.cache.put(key, data)
+        return data
+
+    async def synthesize_async(self, text, lang='en'):
+        return await self._run_async(self.synthesize, text, lang)
+
+    def _remember(self, key, text, lang):
+        with self._lock:
+            self._texts[key] = (text, lang)
+            self._texts.move_to_end(key)
+            while len(self._texts) > self.max_texts:
+                self._texts.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def register(self, text, lang):
+        """Remember which text an audio ID stands for and return the ID"""
+        key = audio_id(text, lang)
+        self._remember(key, text, lang)
+        if self.directory is None:
+            return key
+        path = self._path(key)
+        try:
+            if os.path.exists(path):
+                # Touched, so pruning keeps recently used IDs
+                os.utime(path)
+            else:
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump({'text': text, 'lang': lang}, f, ensure_ascii=False)
+                os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not store audio ID {key}: {e}")
+        with self._lock:
+            self._registered += 1
+            prune = self._registered % SPEECH_PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+        return key
+
+    def _prune(self):
+        """Delete the least recently registered ID files beyond max_texts"""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+            if len(entries) <= self.max_texts:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_texts]:
+                os.remove(entry.path)
+        except OSError as e:
+            logger.warning(f"Could not prune audio IDs: {e}")
+
+    def _lookup(self, key):
+        """(text, lang) registered for key by this or another process, or None"""
+        with self._lock:
+            entry = self._texts.get(key)
+        if entry is not None or self.directory is None or not re.fullmatch(r'[0-9a-f]{32}', key):
+            return entry
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                stored = json.load(f)
+            entry = (stored['text'], stored['lang'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self._remember(key, *entry)
+        return entry
+
+    def prepare(self, text, lang, owner=None):
+        """Register text and start synthesizing it in the background; returns its audio ID"""
+        key = self.register(text, lang)
+        if self.speculative is not None:
+            return self.speculative.submit(text, lang, owner=owner)
+        return key
+
+    def audio(self, key):
+        """Audio for a registered ID, or None if the ID is unknown
+
+        A background synthesis already under way is waited for within the
+        caller's deadline; one still queued is synthesized right here, at
+        the caller's priority.
+        """
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        with self._budgeted():
+            if self.speculative is not None:
+                data = self.speculative.wait(key, current_deadline())
+            if data is None:
+                entry = self._lookup(key)
+                if entry is None:
+                    return None
+                data = self.synthesize(*entry)
+        return data
+
+    def stats(self):
+        return {
+            'audio_cache': self.cache.stats(),
+            'speculative_tts': self.speculative.stats() if self.speculative is not None else None,
+        }
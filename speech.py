@@ -0,0 +1,254 @@
+import contextvars
+import hashlib
+import io
+import queue
+import re
+import threading
+from collections import OrderedDict
+from time import monotonic, time
+
+from resilience import CANCEL_POLL_SECONDS
+
+
+def audio_id(text, lang):
+    """Stable content-hash ID for the audio of text spoken in lang"""
+    return hashlib.sha256(f"{lang}\0{text}".encode('utf-8')).hexdigest()[:32]
+
+
+def synthesize(text, lang):
+    """Generate MP3 bytes for text with gTTS"""
+    # Imported here so that loading this module stays cheap (see service.import_backends)
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=False).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+# gTTS sends at most 100 characters per upstream request, so segments of about
+# that size map to one request each and can all be in flight at once
+SEGMENT_CHARS = 100
+
+# Sentence ends in Latin, Devanagari, CJK and Arabic scripts, plus line breaks
+_SENTENCE_RE = re.compile(r"[^.!?।。！？؟\n]*(?:[.!?।。！？؟]+|\n+|$)")
+
+
+def split_sentences(text, max_chars=SEGMENT_CHARS):
+    """Split text at sentence boundaries, merging short sentences up to max_chars"""
+    segments = []
+    current = ''
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group(0).strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+def _strip_id3(data):
+    """Drop ID3v2/ID3v1 tags so MP3 segments concatenate into one clean frame stream"""
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b'TAG':
+        data = data[:-128]
+    return data
+
+
+def synthesize_parallel(text, lang, executor, cache=None, synthesize=synthesize):
+    """Synthesize sentence segments concurrently on executor and join their MP3 frames in order
+
+    Each segment is cached on its own, so a long text that shares sentences
+    with earlier ones only synthesizes what is new.
+    """
+    segments = split_sentences(text)
+    if len(segments) <= 1:
+        return synthesize(text, lang)
+
+    def run(segment):
+        key = audio_id(segment, lang)
+        data = cache.get(key) if cache is not None else None
+        if data is None:
+            data = synthesize(segment, lang)
+            if cache is not None:
+                cache.put(key, data)
+        return data
+
+    # Each segment runs in a copy of the caller's context so request deadlines still apply
+    futures = [executor.submit(contextvars.copy_context().run, run, segment) for segment in segments]
+    parts = [future.result() for future in futures]
+    return parts[0] + b''.join(_strip_id3(part) for part in parts[1:])
+
+
+class AudioCache:
+    """Thread-safe LRU of synthesized audio, bounded by total bytes"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._items), 'bytes': self._size,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class _Job:
+    def __init__(self, key, text, lang):
+        self.key = key
+        self.text = text
+        self.lang = lang
+        self.queued_at = time()
+        self.owners = set()
+        self.cancelled = False
+        self.started = False
+        self.done = threading.Event()
+
+
+class SpeculativeSynthesizer:
+    """Synthesizes audio in the background before anyone asks for it
+
+    Jobs wait in a bounded queue; when it is full new work is dropped rather
+    than delaying anything. A job is cancelled when the same owner submits a
+    newer one (the earlier result was never played) or when it has waited
+    longer than max_wait seconds.
+    """
+
+    def __init__(self, cache, synthesize=synthesize, workers=2, max_queue=32, max_wait=30, start=True):
+        self.cache = cache
+        self._synthesize = synthesize
+        self.workers = workers
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}  # audio id -> job still queued or running
+        self._owners = {}  # owner -> latest job
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self._started = False
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the worker threads; safe to call twice"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'speculative-tts-{i}', daemon=True).start()
+
+    def submit(self, text, lang, owner=None):
+        """Queue text for synthesis and return its audio ID, or None if the queue is full"""
+        key = audio_id(text, lang)
+        if key in self.cache:
+            return key
+
+        with self._lock:
+            previous = self._owners.get(owner)
+            if previous is not None and previous.key != key and not previous.done.is_set():
+                previous.cancelled = True
+            if key in self._jobs:
+                job = self._jobs[key]
+                job.cancelled = False
+            else:
+                job = _Job(key, text, lang)
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    self.dropped += 1
+                    return None
+                self._jobs[key] = job
+            if owner is not None:
+                self._owners[owner] = job
+                job.owners.add(owner)
+        return key
+
+    def wait(self, key, deadline=None):
+        """Audio of the background job for key once it finishes, or None
+
+        A job that has not started yet is taken off the queue and None is
+        returned at once, so the caller synthesizes the text at its own
+        priority instead of waiting behind background work. A running job is
+        waited for until deadline (if given) expires or is cancelled, and at
+        most max_wait seconds.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.started:
+                job.cancelled = True
+                return None
+        if job is not None:
+            give_up = monotonic() + self.max_wait
+            while not job.done.wait(CANCEL_POLL_SECONDS) and monotonic() < give_up:
+                if deadline is not None and (deadline.expired() or deadline.cancelled()):
+                    break
+        return self.cache.get(key)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    skip = job.cancelled or time() - job.queued_at > self.max_wait
+                    if skip:
+                        self.cancelled += 1
+                    else:
+                        job.started = True
+                if skip:
+                    continue
+                self.cache.put(job.key, self._synthesize(job.text, job.lang))
+                with self._lock:
+                    self.completed += 1
+            except Exception:
+                # Speculative work is best effort; the play button falls back to /speak
+                pass
+            finally:
+                with self._lock:
+                    self._jobs.pop(job.key, None)
+                    for owner in job.owners:
+                        if self._owners.get(owner) is job:
+                            del self._owners[owner]
+                job.done.set()
+                self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            return {'queued': self._queue.qsize(), 'completed': self.completed,
+                    'cancelled': self.cancelled, 'dropped': self.dropped}
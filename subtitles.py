@@ -0,0 +1,80 @@
+import re
+
+from packing import MAX_REQUEST_CHARS, cost
+
+SUBTITLE_FORMATS = {'.srt': 'application/x-subrip', '.vtt': 'text/vtt'}
+
+# SRT uses a comma before the milliseconds, WebVTT a dot and optional hours
+_TIMING_RE = re.compile(r"^\s*(?:\d+:)?\d{2}:\d{2}[,.]\d{3}\s+-->\s+(?:\d+:)?\d{2}:\d{2}[,.]\d{3}")
+
+# Positioning overrides such as {\an8} are kept out of the translated text
+_OVERRIDE_RE = re.compile(r"^(\{\\[^}]*\})+")
+
+
+class Cue:
+    """One timed subtitle: the lines before the text are kept byte-for-byte"""
+
+    def __init__(self, head, text, prefix=''):
+        self.head = head  # identifier and timing lines
+        self.text = text
+        self.prefix = prefix
+
+    def render(self, text):
+        return ''.join(self.head) + self.prefix + text + '\n\n'
+
+
+def parse_subtitles(lines):
+    """Cues and verbatim blocks (WEBVTT header, NOTE, STYLE) of a subtitle file, in order
+
+    Yields Cue objects for timed blocks and plain strings for everything else.
+    """
+    block = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            block.append(line)
+            continue
+        if block:
+            yield _block(block)
+            block = []
+    if block:
+        yield _block(block)
+
+
+def _block(lines):
+    for i, line in enumerate(lines):
+        if _TIMING_RE.match(line):
+            head = [f"{l}\n" for l in lines[:i + 1]]
+            text = '\n'.join(lines[i + 1:])
+            prefix = _OVERRIDE_RE.match(text)
+            prefix = prefix.group(0) if prefix else ''
+            return Cue(head, text[len(prefix):], prefix)
+    return '\n'.join(lines) + '\n\n'
+
+
+def cue_windows(items, limit=MAX_REQUEST_CHARS):
+    """Group consecutive blocks so each group's cue text fits one packed upstream request
+
+    Neighbouring cues travel together, which gives the provider the context
+    of the surrounding dialogue, and each group can be written out as soon
+    as it is translated.
+    """
+    window = []
+    size = 0
+    for item in items:
+        if isinstance(item, Cue) and item.text.strip():
+            needed = cost(len(window), item.text)
+            if window and size + needed > limit:
+                yield window
+                window, size = [], 0
+            size += needed
+        window.append(item)
+    if window:
+        yield window
+
+
+def translate_window(window, translate_many, source, target):
+    """Rendered text of a group of blocks, with cue texts translated in one batch"""
+    cues = [item for item in window if isinstance(item, Cue)]
+    translated = iter(translate_many([cue.text for cue in cues], source, target))
+    return ''.join(item.render(next(translated)) if isinstance(item, Cue) else item for item in window)
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Offline provider and no background threads, set before app is first imported
+_scratch = tempfile.mkdtemp(prefix='translator-tests-')
+os.environ.setdefault('TRANSLATION_PROVIDERS', 'local:local:0')
+os.environ.setdefault('DEFER_BACKGROUND_THREADS', '1')
+os.environ.setdefault('LANGUAGES_SNAPSHOT', os.path.join(_scratch, 'languages.json'))
+os.environ.setdefault('JOBS_DIR', os.path.join(_scratch, 'jobs'))
+os.environ.setdefault('SPEECH_DIR', os.path.join(_scratch, 'speech'))
+os.environ.setdefault('PHRASEBOOK_DIR', os.path.join(_scratch, 'phrasebooks'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
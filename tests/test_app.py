@@ -0,0 +1,121 @@
+import io
+import itertools
+import json
+
+import pytest
+
+import app as translator_app
+from admission import AdmissionController
+
+_addresses = (f"10.0.{i // 250}.{i % 250 + 1}" for i in itertools.count())
+
+
+@pytest.fixture
+def client():
+    client = translator_app.app.test_client()
+    # A fresh address per test, so the per-IP rate limit never interferes
+    client.environ_base['REMOTE_ADDR'] = next(_addresses)
+    return client
+
+
+@pytest.fixture
+def fake_speech(monkeypatch):
+    monkeypatch.setattr(translator_app.speech_service, 'synthesize', lambda text, lang='en': b'ID3' + text.encode())
+
+
+def test_speak_gives_back_its_admission_slot(client, fake_speech):
+    for _ in range(3):
+        response = client.get('/speak/en/hello')
+        assert response.status_code == 200
+        response.close()
+    assert translator_app.admission['speech'].stats()['active'] == 0
+
+
+def test_streamed_response_holds_its_slot_until_closed(client):
+    response = client.post('/api/translate/multi', json={'text': 'good day', 'targets': ['fr', 'de'], 'stream': True},
+                           buffered=False)
+    lines = [json.loads(line) for line in response.iter_encoded() for line in line.splitlines() if line]
+    assert {line['target'] for line in lines[1:]} == {'fr', 'de'}
+    response.close()
+    assert translator_app.admission['translate'].stats()['active'] == 0
+
+
+def test_prose_with_angle_brackets_is_translated_as_text(client):
+    response = client.post('/api/translate', json={'text': 'if x<y and z>w then go', 'target': 'fr'})
+    assert response.get_json()['translation'] == '[fr] if x<y and z>w then go'
+
+
+@pytest.mark.parametrize('path, payload', [
+    ('/api/translate', {'text': 'hi', 'source': ['x']}),
+    ('/api/translate/batch', {'texts': ['hi'], 'target': {'a': 1}}),
+    ('/api/translate/multi', {'text': 'hi', 'source': 5, 'targets': ['fr']}),
+    ('/api/speech', {'text': 'hi', 'lang': ['en']}),
+])
+def test_non_string_language_codes_are_rejected(client, path, payload):
+    assert client.post(path, json=payload).status_code == 400
+
+
+def test_streamed_subtitles_keep_the_request_deadline(client, monkeypatch):
+    from resilience import current_deadline
+
+    seen = []
+
+    def translate_many(texts, source, target):
+        seen.append(current_deadline())
+        return list(texts)
+
+    monkeypatch.setattr(translator_app.translator, 'translate_many', translate_many)
+    cues = ''.join(f"{i}\n00:00:{i % 60:02d},000 --> 00:00:{i % 60:02d},500\n{'word ' * 40}\n\n"
+                   for i in range(1, 61))
+    response = client.post('/api/subtitles', data={'file': (io.BytesIO(cues.encode()), 'film.srt'), 'target': 'fr'},
+                           buffered=False)
+    assert response.status_code == 200
+    body = b''.join(response.iter_encoded())
+    assert body.count(b'-->') == 60
+    assert len(seen) > 1
+    assert all(deadline is not None and deadline is seen[0] for deadline in seen)
+    response.close()
+    assert current_deadline() is None
+
+
+def test_page_form_translates_markdown_when_asked(client):
+    response = client.post('/', data={'text': 'Say **hello** to `pip`', 'source': 'en', 'target': 'fr',
+                                      'format': 'markdown'})
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert '[fr] Say **hello** to `pip`' in page
+    assert '<option value="markdown" selected>' in page
+
+
+@pytest.mark.parametrize('detected', ['auto', 'xx'])
+def test_multi_leaves_uncertain_or_unsupported_detection_to_the_provider(client, monkeypatch, detected):
+    monkeypatch.setattr(translator_app.translator, 'detect', lambda text: detected)
+    response = client.post('/api/translate/multi', json={'text': 'guten tag', 'targets': ['fr', 'de']})
+    body = response.get_json()
+    assert body['source'] == 'auto'
+    assert {r['target']: r['translation'] for r in body['results']} == {'fr': '[fr] guten tag', 'de': '[de] guten tag'}
+
+
+def test_multi_uses_a_supported_detection(client, monkeypatch):
+    monkeypatch.setattr(translator_app.translator, 'detect', lambda text: 'de')
+    response = client.post('/api/translate/multi', json={'text': 'guten tag', 'targets': ['fr', 'de']})
+    body = response.get_json()
+    assert body['source'] == 'de'
+    assert {r['target']: r['translation'] for r in body['results']} == {'fr': '[fr] guten tag', 'de': 'guten tag'}
+
+
+def test_full_admission_queue_sheds_with_retry_after(client, monkeypatch):
+    controller = AdmissionController(limit=1, queue_size=0)
+    monkeypatch.setitem(translator_app.admission, 'translate', controller)
+    release = controller.acquire()
+    try:
+        response = client.post('/api/translate', json={'text': 'hello', 'target': 'fr'})
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        assert controller.stats()['shed']['queue_full'] == 1
+    finally:
+        release()
+    response = client.post('/api/translate', json={'text': 'hello', 'target': 'fr'})
+    assert response.status_code == 200
+    response.close()
+    assert controller.stats()['active'] == 0
@@ -0,0 +1,43 @@
+import json
+
+import batch_translate
+
+
+def test_rerun_resumes_from_the_checkpoint(tmp_path, monkeypatch, capsys):
+    records = [{'id': i, 'text': f"record {chr(97 + i % 26)}{chr(97 + i // 26)} to translate"} for i in range(50)]
+    source = tmp_path / 'in.jsonl'
+    source.write_text(''.join(json.dumps(r) + '\n' for r in records), encoding='utf-8')
+    output = tmp_path / 'out.jsonl'
+    argv = [str(source), '-f', 'text', '-t', 'fr', '-o', str(output), '-j', '1', '--batch-size', '10']
+    monkeypatch.setattr(batch_translate, 'CHECKPOINT_INTERVAL', 0)
+
+    translate_batch = batch_translate.translate_batch
+    translated = []
+
+    def failing_third_batch(translator, batch, *args):
+        if len(translated) >= 20:
+            raise ConnectionError('upstream went away')
+        translated.extend(r['id'] for r in batch)
+        return translate_batch(translator, batch, *args)
+
+    monkeypatch.setattr(batch_translate, 'translate_batch', failing_third_batch)
+    assert batch_translate.main(argv) == 1
+    assert 'Run the same command again' in capsys.readouterr().err
+    checkpoint = json.loads((tmp_path / 'out.jsonl.checkpoint').read_text(encoding='utf-8'))
+    assert checkpoint['rows'] == 20
+    # A batch written after the last checkpoint, which the rerun must drop
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write('{"id": 20, "text": "partial"}\n')
+
+    translated.clear()
+
+    def counting(translator, batch, *args):
+        translated.extend(r['id'] for r in batch)
+        return translate_batch(translator, batch, *args)
+
+    monkeypatch.setattr(batch_translate, 'translate_batch', counting)
+    assert batch_translate.main(argv) == 0
+    assert translated == list(range(20, 50))
+    lines = output.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == [dict(r, text=f"[fr] {r['text']}") for r in records]
+    assert not (tmp_path / 'out.jsonl.checkpoint').exists()
@@ -0,0 +1,60 @@
+import io
+import json
+import os
+from time import monotonic, sleep
+
+from werkzeug.datastructures import FileStorage
+
+from jobs import BATCH_UNITS, JobManager
+from providers import LocalProvider
+from resilience import Resilience
+from service import TranslationService
+
+
+class Crash(BaseException):
+    """Stands in for the process dying part way through a job"""
+
+
+def test_job_resumes_from_its_checkpoint_after_a_crash(tmp_path):
+    lines = [f"line {chr(97 + i % 26)}{chr(97 + i // 26)} of the document\n" for i in range(BATCH_UNITS * 2 + 50)]
+    service = TranslationService(providers=[LocalProvider('local', latency=0)], resilience=Resilience())
+    sent = []
+
+    def crash_on_second_batch(texts, source, target):
+        if sent:
+            raise Crash()
+        sent.append(list(texts))
+        return service.translate_many(texts, source, target)
+
+    first = JobManager(str(tmp_path), crash_on_second_batch, start=False)
+    state = first.submit(FileStorage(io.BytesIO(''.join(lines).encode()), filename='doc.txt'), 'doc.txt', 'en', 'fr')
+    try:
+        first._run(state)
+    except Crash:
+        pass
+    checkpoint = first.get(state['id'])
+    assert checkpoint['status'] == 'running'
+    assert checkpoint['units_done'] == BATCH_UNITS
+    # Half of the next batch made it to disk before the crash
+    part_path = first.output_path(checkpoint) + '.part'
+    with open(part_path, 'ab') as f:
+        f.write(b'[fr] half-written')
+
+    resent = []
+
+    def translate(texts, source, target):
+        resent.extend(texts)
+        return service.translate_many(texts, source, target)
+
+    JobManager(str(tmp_path), translate, workers=1)
+    give_up = monotonic() + 5
+    while first.get(state['id'])['status'] != 'done' and monotonic() < give_up:
+        sleep(0.02)
+    done = first.get(state['id'])
+    assert done['status'] == 'done', done
+    assert resent == [line.strip() for line in lines[BATCH_UNITS:]]
+    with open(first.output_path(done), encoding='utf-8') as f:
+        assert f.read() == ''.join(f"[fr] {line}" for line in lines)
+    assert not os.path.exists(part_path)
+    with open(os.path.join(str(tmp_path), state['id'], 'state.json'), encoding='utf-8') as f:
+        assert json.load(f)['units_done'] == len(lines)
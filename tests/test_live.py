@@ -0,0 +1,39 @@
+import threading
+
+from live import LiveSession
+from resilience import current_deadline
+
+
+def test_newer_input_cancels_the_call_in_flight():
+    started = threading.Event()
+    cancelled = threading.Event()
+    messages = []
+
+    def translate(text, source, target):
+        if text.startswith('slow'):
+            started.set()
+            deadline = current_deadline()
+            # Like an admission or scheduler wait, polling for cancellation
+            while not deadline.cancelled():
+                if deadline.expired():
+                    raise TimeoutError('never cancelled')
+                threading.Event().wait(0.01)
+            cancelled.set()
+            raise RuntimeError(f"Request cancelled: {deadline.cancel_reason}")
+        return f"[{target}] {text}"
+
+    session = LiveSession(translate, messages.append, debounce=0.01, budget=2.0)
+    try:
+        session.set_text('slow sentence')
+        assert started.wait(2)
+        session.set_text('fast sentence')
+        assert cancelled.wait(1)
+        for _ in range(100):
+            if messages:
+                break
+            threading.Event().wait(0.01)
+    finally:
+        session.close()
+    assert [m['type'] for m in messages] == ['diff']
+    assert messages[0]['ops'] == [{'index': 0, 'text': '[en] fast sentence'}]
+    assert session.superseded == 1
@@ -0,0 +1,55 @@
+from markup import detect_format, html_segments, markdown_segments, reinject, translate_markup
+
+
+def tagged(texts, source, target):
+    return [f"[{target}] {text}" for text in texts]
+
+
+def test_comparisons_in_prose_are_not_html():
+    assert detect_format("if x<y and z>w then go") is None
+    assert detect_format("use **bold** here") is None
+
+
+def test_closed_known_elements_are_html():
+    assert detect_format("<p>Hello</p>") == 'html'
+    assert detect_format("<!DOCTYPE html><title>x") == 'html'
+
+
+def test_inline_html_stays_inside_its_sentence():
+    segments = html_segments("<p>The <b>red</b> car is fast.</p><p>Run <code>ls -l</code> now</p>")
+    assert [s.text for s in segments] == ["The {0}red{1} car is fast.", "Run {0} now"]
+    assert segments[1].markup == ["<code>ls -l</code>"]
+
+
+def test_html_roundtrip_keeps_markup_and_escapes_text():
+    source = "<ul><li><a href='/x'>Tom &amp; Jerry</a></li></ul><script>var s = 'hi';</script>"
+    assert translate_markup(source, 'html', tagged, 'en', 'fr') == \
+        "<ul><li>[fr] <a href='/x'>Tom &amp; Jerry</a></li></ul><script>var s = 'hi';</script>"
+
+
+def test_markdown_paragraph_is_one_item():
+    source = "# Title\n\nThe **red** car\nis fast, see [docs](http://x.y/z).\n\n```\ncode\n```\n"
+    segments = markdown_segments(source)
+    assert [s.text for s in segments] == ["Title", "The {0}red{1} car is fast, see {2}docs{3}."]
+    assert segments[1].markup == ['**', '**', '[', '](http://x.y/z)']
+
+
+def test_markdown_table_cells_are_separate():
+    assert [s.text for s in markdown_segments("| a cell | b cell |\n|---|---|\n")] == ["a cell", "b cell"]
+
+
+def test_reinject_replaces_only_segments():
+    source = "<p>The <b>red</b> car</p>"
+    segments = html_segments(source)
+    assert reinject(source, segments, ["La voiture {0}rouge{1}"]) == "<p>La voiture <b>rouge</b></p>"
+
+
+def test_lost_placeholder_falls_back_to_fragments():
+    calls = []
+
+    def lossy(texts, source, target):
+        calls.append(list(texts))
+        return [text.replace('{1}', '').upper() for text in texts]
+
+    assert translate_markup("<p>The <b>red</b> car</p>", 'html', lossy, 'en', 'fr') == "<p>THE <b>RED</b> CAR</p>"
+    assert calls == [["The {0}red{1} car"], ["The", "red", "car"]]
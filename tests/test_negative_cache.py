@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from negative_cache import CachedFailure, NegativeCache, classify
+from resilience import DeadlineExceeded
+
+
+class NotValidPayload(Exception):
+    pass
+
+
+class TooManyRequests(Exception):
+    pass
+
+
+def test_generic_errors_are_upstream_errors():
+    assert classify(json.JSONDecodeError("Expecting value", "", 0)) == 'upstream_error'
+    assert classify(KeyError('translatedText')) == 'upstream_error'
+    assert classify(ValueError("bad")) == 'upstream_error'
+
+
+def test_provider_rejections_are_classified_by_name():
+    assert classify(NotValidPayload("x")) == 'unsupported'
+    assert classify(TooManyRequests("x")) == 'rate_limited'
+    assert classify(DeadlineExceeded("x")) is None
+
+
+def test_failures_are_answered_until_cleared():
+    cache = NegativeCache()
+    cache.add_failure("hello there", 'en', 'fr', ConnectionError("down"))
+    with pytest.raises(CachedFailure):
+        cache.lookup("hello there", 'en', 'fr')
+    assert cache.lookup("hello there", 'en', 'fr', failures=False) is None
+    cache.clear_pair('en-fr')
+    assert cache.lookup("hello there", 'en', 'fr') is None
@@ -0,0 +1,66 @@
+import pytest
+
+from packing import join, pack, split, translate_packed
+from providers import LocalProvider
+from resilience import Resilience
+from service import TranslationService
+
+
+def test_pack_respects_the_limit_and_isolates_marker_text():
+    texts = ['a' * 40, 'b' * 40, 'c' * 40, 'see [[7]] here', '']
+    batches = list(pack(texts, limit=100))
+    assert batches == [[0, 1], [3], [2]]
+
+
+def test_split_recovers_every_item_with_intact_markers():
+    payload = join(['one', 'two', 'three'], [0, 1, 2])
+    assert split(payload.upper(), [0, 1, 2]) == {0: 'ONE', 1: 'TWO', 2: 'THREE'}
+
+
+def test_split_drops_items_next_to_a_mangled_marker():
+    assert split("[[0]]\nun\n[1]]\ndeux\n[[2]]\ntrois", [0, 1, 2]) == {2: 'trois'}
+
+
+def test_translate_packed_retries_only_the_damaged_items():
+    calls = []
+
+    def translate(text):
+        calls.append(text)
+        return text.replace('[[1]]', '[1]').upper()
+
+    stats = {}
+    assert translate_packed(['one', 'two', 'three'], translate, stats=stats) == ['ONE', 'TWO', 'THREE']
+    assert stats == {'items': 3, 'calls': 3, 'fallbacks': 2}
+
+
+def test_local_provider_tags_each_packed_item():
+    payload = join(['hello there', 'good night'], [0, 1])
+    translated = LocalProvider('local', latency=0).translate(payload, 'en', 'fr')
+    assert split(translated, [0, 1]) == {0: '[fr] hello there', 1: '[fr] good night'}
+
+
+def test_translate_many_packs_to_the_providers_limit():
+    service = TranslationService(providers=[LocalProvider('small', latency=0, char_limit=500)],
+                                 resilience=Resilience())
+    texts = [f"short text number {'x' * (i % 5)} {chr(97 + i % 26) * 3} {i}" for i in range(24)]
+    assert sum(map(len, texts)) > 500
+    results = service.translate_many(texts, 'en', 'fr')
+    assert results == [f"[fr] {text}" for text in texts]
+    assert service.stats()['packing']['calls'] >= 2
+
+
+def test_translate_many_without_a_deadline_budgets_each_upstream_request():
+    service = TranslationService(providers=[LocalProvider('slow', latency=0.2, char_limit=100)],
+                                 resilience=Resilience(), budget=0.5)
+    texts = [f"batch text {chr(97 + i)} " + 'word ' * 14 for i in range(10)]
+    results = service.translate_many(texts, 'en', 'fr')
+    assert results == [f"[fr] {text}" for text in texts]
+    assert service.stats()['packing']['calls'] >= 5
+
+
+def test_detect_is_repeatable_and_spelled_like_the_providers():
+    pytest.importorskip('langdetect')
+    service = TranslationService(providers=[LocalProvider('local', latency=0)], resilience=Resilience())
+    hebrew = 'שלום לכולם, מה שלומכם היום? אני מקווה שהכל בסדר אצלכם בבית ובעבודה.'
+    assert {service.detect(hebrew) for _ in range(5)} == {'iw'}
+    assert service.detect('ok') == 'auto'
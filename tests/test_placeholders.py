@@ -0,0 +1,28 @@
+from placeholders import is_placeholder_only, protect, restore
+
+
+def test_protect_and_restore_round_trip():
+    text = "Open https://example.com/a?b=1 and run `make test` before 10:30"
+    masked, spans = protect(text)
+    assert 'https://' not in masked and '`' not in masked
+    assert restore(masked, spans) == text
+
+
+def test_short_numbers_stay_inline():
+    assert protect("Buy 3 apples") == ("Buy 3 apples", [])
+
+
+def test_restore_rejects_lost_or_duplicated_placeholders():
+    masked, spans = protect("Visit https://example.com now or https://example.org later")
+    assert restore(masked.replace('{1}', ''), spans) is None
+    assert restore(masked.replace('{1}', '{0}'), spans) is None
+    assert restore("{ 1 } puis { 0 }", spans) == "https://example.org puis https://example.com"
+
+
+def test_text_with_its_own_placeholders_is_left_alone():
+    assert protect("Hello {0}, see https://x.org") == ("Hello {0}, see https://x.org", [])
+
+
+def test_placeholder_only_text_needs_no_translation():
+    masked, _ = protect("https://example.com 🎉")
+    assert is_placeholder_only(masked)
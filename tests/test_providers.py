@@ -0,0 +1,13 @@
+from providers import LocalProvider, ProviderRouter
+from resilience import Resilience
+
+
+def test_router_fails_over_and_then_avoids_a_failing_provider():
+    router = ProviderRouter([LocalProvider('broken', latency=0, error_rate=1.0), LocalProvider('working', latency=0.01)],
+                            Resilience(), explore=0)
+    results = [router.translate(f"sentence {chr(97 + i)}", 'en', 'de') for i in range(10)]
+    assert results == [f"[de] sentence {chr(97 + i)}" for i in range(10)]
+    providers = router.stats()['providers']
+    assert providers['working:en-de']['calls'] == 10
+    assert router.failovers == providers['broken:en-de']['calls'] < 10
+    assert router.candidates('another one', 'en', 'de')[0].name == 'working'
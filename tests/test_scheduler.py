@@ -0,0 +1,47 @@
+import threading
+from time import monotonic, sleep
+
+from providers import LocalProvider
+from resilience import Resilience
+from scheduler import PriorityScheduler, priority
+from service import TranslationService
+
+
+class RecordingProvider(LocalProvider):
+    def __init__(self):
+        super().__init__('local', latency=0.02)
+        self.order = []
+
+    def translate(self, text, source, target):
+        self.order.append(text)
+        return super().translate(text, source, target)
+
+
+def _wait_until(condition):
+    give_up = monotonic() + 5
+    while not condition():
+        assert monotonic() < give_up
+        sleep(0.01)
+
+
+def test_interactive_work_is_served_before_earlier_and_shorter_batch_work():
+    scheduler = PriorityScheduler(slots=1, reserved=0, aging=60)
+    provider = RecordingProvider()
+    service = TranslationService(providers=[provider], resilience=Resilience(scheduler=scheduler))
+
+    def translate(text, name):
+        with priority(name):
+            service.translate(text, 'en', 'fr')
+
+    hold = scheduler.acquire()
+    threads = []
+    for text, name in (('batch item', 'batch'), ('a longer interactive sentence', 'interactive')):
+        thread = threading.Thread(target=translate, args=(text, name))
+        thread.start()
+        threads.append(thread)
+        _wait_until(lambda: scheduler.stats()['queued'][name] == 1)
+    hold()
+    for thread in threads:
+        thread.join(5)
+    assert provider.order == ['a longer interactive sentence', 'batch item']
+    assert scheduler.stats()['served'] == {'interactive': 2, 'batch': 1, 'background': 0}
@@ -0,0 +1,102 @@
+import threading
+from time import monotonic
+
+import pytest
+
+import service
+from resilience import DeadlineExceeded, Resilience, clear_deadline, start_deadline
+from scheduler import priority
+from service import SpeechService
+
+
+def test_background_segments_do_not_hold_up_requests(monkeypatch):
+    release = threading.Event()
+    busy = threading.Semaphore(0)
+
+    def fake_synthesize(text, lang):
+        if text.startswith('slow'):
+            busy.release()
+            release.wait(5)
+        return b'ID3' + text.encode()
+
+    monkeypatch.setattr(service, 'synthesize', fake_synthesize)
+    speech = SpeechService(resilience=Resilience(), start=False)
+    long_text = ' '.join(f"slow sentence number {i} goes here and keeps going for a while." for i in range(12))
+
+    def speculate():
+        with priority('background'):
+            speech.synthesize(long_text, 'en')
+
+    background = threading.Thread(target=speculate)
+    background.start()
+    for _ in range(4):
+        assert busy.acquire(timeout=5)
+    try:
+        started = monotonic()
+        text = "First quick sentence that is long enough to need its own segment here. " \
+               "Second quick sentence that is also long enough to get a segment."
+        assert speech.synthesize(text, 'en').startswith(b'ID3')
+        assert monotonic() - started < 1
+    finally:
+        release.set()
+        background.join()
+
+
+def test_audio_ids_are_served_by_every_process_sharing_the_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(service, 'synthesize', lambda text, lang: f"{lang}:{text}".encode())
+    registering = SpeechService(resilience=Resilience(), start=False, directory=str(tmp_path))
+    serving = SpeechService(resilience=Resilience(), start=False, directory=str(tmp_path))
+    key = registering.register('Bonjour tout le monde', 'fr')
+    assert serving.audio(key) == b'fr:Bonjour tout le monde'
+    assert serving.audio('0' * 32) is None
+    assert serving.audio('../' + key) is None
+
+
+def test_shared_audio_ids_are_pruned_to_max_texts(monkeypatch, tmp_path):
+    monkeypatch.setattr(service, 'SPEECH_PRUNE_EVERY', 5)
+    speech = SpeechService(resilience=Resilience(), start=False, directory=str(tmp_path), max_texts=3)
+    for i in range(10):
+        speech.register(f"text {i}", 'en')
+    assert len(list(tmp_path.glob('*.json'))) == 3
+
+
+def test_audio_takes_over_speculative_work_that_has_not_started(monkeypatch):
+    monkeypatch.setattr(service, 'synthesize', lambda text, lang: f"{lang}:{text}".encode())
+    speech = SpeechService(resilience=Resilience(), speculative=True, start=False)
+    key = speech.prepare('Guten Morgen', 'de')
+    started = monotonic()
+    assert speech.audio(key) == b'de:Guten Morgen'
+    assert monotonic() - started < 1
+    assert speech.speculative._jobs[key].cancelled
+
+
+def test_audio_waits_for_running_speculative_work_only_within_the_deadline(monkeypatch):
+    running = threading.Event()
+    release = threading.Event()
+
+    def fake_synthesize(text, lang):
+        running.set()
+        release.wait(5)
+        return b'late'
+
+    monkeypatch.setattr(service, 'synthesize', fake_synthesize)
+    speech = SpeechService(resilience=Resilience(), speculative=True)
+    key = speech.prepare('Buenas noches', 'es')
+    assert running.wait(5)
+    start_deadline(0.3)
+    started = monotonic()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            speech.audio(key)
+        assert monotonic() - started < 1
+    finally:
+        clear_deadline()
+        release.set()
+
+
+def test_segment_pools_follow_the_speech_bulkhead_settings(monkeypatch):
+    monkeypatch.setenv('SPEECH_UPSTREAM_CONCURRENCY', '6')
+    monkeypatch.setenv('SPEECH_INTERACTIVE_RESERVED_SLOTS', '2')
+    speech = SpeechService(resilience=service.resilience_from_env('SPEECH_'), start=False)
+    assert speech._segment_pool._max_workers == 6
+    assert speech._background_segment_pool._max_workers == 4
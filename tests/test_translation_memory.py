@@ -0,0 +1,60 @@
+from translation_memory import TranslationMemory, _substitute, mask_variables
+
+
+def test_mask_variables_keeps_sentence_initial_capitals():
+    assert mask_variables("Order 42 shipped to Alice") == ("order # shipped to #", ['42', 'Alice'])
+
+
+def test_substitute_swaps_changed_values():
+    assert _substitute("Commande 42 expédiée", ['42'], ['43']) == "Commande 43 expédiée"
+
+
+def test_substitute_refuses_a_value_that_changes_at_only_some_positions():
+    assert _substitute("Page 5 sur 5", ['5', '5'], ['5', '6']) is None
+
+
+def test_substitute_refuses_values_missing_from_the_translation():
+    assert _substitute("Commande quarante-deux", ['42'], ['43']) is None
+
+
+def test_exact_template_hit_reuses_translation_with_new_values():
+    memory = TranslationMemory()
+    memory.add("Page 5 of 6", 'en', 'fr', "Page 5 sur 6")
+    assert memory.lookup("Page 7 of 9", 'en', 'fr') == "Page 7 sur 9"
+    assert memory.lookup("Page 7 of 9", 'en', 'de') is None
+
+
+def test_repeated_value_that_diverges_is_a_miss():
+    memory = TranslationMemory()
+    memory.add("Page 5 of 5", 'en', 'fr', "Page 5 sur 5")
+    assert memory.lookup("Page 5 of 6", 'en', 'fr') is None
+
+
+def test_near_duplicates_are_not_reused_by_default():
+    memory = TranslationMemory()
+    text = ("the quarterly maintenance window for the storage cluster has been scheduled for the weekend "
+            "and every team should plan their deployments around it accordingly")
+    memory.add(text, 'en', 'fr', "traduction")
+    assert memory.lookup(text.replace("has been", "has not been"), 'en', 'fr') is None
+    assert memory.lookup(text, 'en', 'fr') == "traduction"
+
+
+def test_fuzzy_reuse_when_enabled():
+    memory = TranslationMemory(min_similarity=0.8)
+    memory.add("please restart the application server now", 'en', 'fr', "traduction")
+    assert memory.lookup("please restart the application servers now", 'en', 'fr') == "traduction"
+
+
+def _words(i):
+    return ' '.join('abcdefghij'[int(digit)] * 3 for digit in str(i))
+
+
+def test_memory_is_bounded_by_bytes():
+    memory = TranslationMemory(max_bytes=100_000, min_similarity=0.9)
+    for i in range(1000):
+        memory.add(f"say {_words(i)} please", 'en', 'fr', f"dis {_words(i)}")
+    stats = memory.stats()
+    assert 0 < stats['bytes'] <= 100_000
+    assert 0 < stats['entries'] < 1000
+    assert memory.lookup(f"say {_words(999)} please", 'en', 'fr') == f"dis {_words(999)}"
+    assert memory.lookup(f"say {_words(0)} please", 'en', 'fr') is None
@@ -0,0 +1,232 @@
+import re
+import sys
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+
+# Numbers (including dates, times and decimals) and capitalised words are
+# treated as variables: templated notifications differ only in these spans.
+_VARIABLE_RE = re.compile(r"\d+(?:[.,:/-]\d+)*|\b[A-Z][\w'’-]*")
+_SENTENCE_END = ('.', '!', '?', ':', '\n')
+_MARKER = '#'
+
+# Bytes per entry beyond its strings and arrays: the entry tuple, dict slots and LRU links
+_ENTRY_OVERHEAD = 400
+
+
+def _is_sentence_start(text, pos):
+    """True when pos is the first word of a sentence (so capitalised by grammar, not a name)"""
+    before = text[:pos].rstrip()
+    return not before or before.endswith(_SENTENCE_END)
+
+
+def mask_variables(text):
+    """Split text into a normalised template and the list of variable spans it contained"""
+    values = []
+    parts = []
+    last = 0
+    for match in _VARIABLE_RE.finditer(text):
+        value = match.group(0)
+        if not value[0].isdigit() and _is_sentence_start(text, match.start()):
+            continue
+        parts.append(text[last:match.start()])
+        parts.append(_MARKER)
+        values.append(value)
+        last = match.end()
+    parts.append(text[last:])
+    template = ' '.join(''.join(parts).casefold().split())
+    return template, values
+
+
+def _ngrams(template, n):
+    """Character n-grams of template, hashed to 32-bit ints and packed into an array"""
+    padded = f" {template} "
+    if len(padded) <= n:
+        grams = {padded}
+    else:
+        grams = {padded[i:i + n] for i in range(len(padded) - n + 1)}
+    # A rare hash collision only makes two templates look slightly more alike
+    return array('I', {hash(gram) & 0xFFFFFFFF for gram in grams})
+
+
+def _entry_size(template, values, translation, grams):
+    """Approximate bytes held by one entry, including its posting list slots"""
+    return (sys.getsizeof(template) + sys.getsizeof(translation) + sys.getsizeof(values)
+            + sum(sys.getsizeof(v) for v in values) + sys.getsizeof(grams) + 8 * len(grams)
+            + _ENTRY_OVERHEAD)
+
+
+def _substitute(translation, old_values, new_values):
+    """Swap changed variable values inside a stored translation, or None if unsafe"""
+    if len(old_values) != len(new_values):
+        return None
+
+    mapping = {}
+    for old, new in zip(old_values, new_values):
+        # "Page 5 of 5" -> "Page 5 of 6": the stored translation cannot say which 5 is which
+        if mapping.setdefault(old, new) != new:
+            return None
+    changes = {old: new for old, new in mapping.items() if old != new}
+    if not changes:
+        return translation
+
+    alternatives = '|'.join(re.escape(v) for v in sorted(changes, key=len, reverse=True))
+    pattern = re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)")
+    found = {m.group(0) for m in pattern.finditer(translation)}
+    if found != set(changes):
+        # A differing value was translated or reformatted upstream; we can't map it back
+        return None
+    return pattern.sub(lambda m: changes[m.group(0)], translation)
+
+
+class TranslationMemory:
+    """Fuzzy translation memory over past source segments
+
+    Segments are indexed per language pair by their variable-masked template,
+    both exactly (a dict) and, when fuzzy lookups are on, through an inverted
+    index of hashed character n-grams. Memory is bounded by max_bytes, evicting
+    the least recently used entries.
+    Fuzzy lookups probe only the rarest n-grams of the query (prefix
+    filtering), so the candidate set stays tiny even with millions of entries.
+    They are off by default (min_similarity=1.0): a near-duplicate template
+    differs in real words, and "has been" vs "has not been" is a different
+    sentence, so its stored translation is only safe when the caller accepts that.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, min_similarity=1.0, ngram=3, max_candidates=200):
+        self.max_bytes = max_bytes
+        self.min_similarity = min_similarity
+        self.ngram = ngram
+        self.max_candidates = max_candidates
+        self._entries = OrderedDict()  # id -> (pair, template, values, translation, grams, size)
+        self._templates = {}  # (pair, template) -> id
+        self._postings = defaultdict(lambda: defaultdict(lambda: array('Q')))  # pair -> gram -> ids
+        self._bytes = 0
+        self._next_id = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, text, source, target, translation):
+        """Remember a translation of text for the given language pair"""
+        pair = (source, target)
+        template, values = mask_variables(text)
+        # Exact lookups need no n-grams, so they are only kept while fuzzy lookups are on
+        grams = _ngrams(template, self.ngram) if self.min_similarity < 1.0 else array('I')
+        size = _entry_size(template, values, translation, grams)
+
+        with self._lock:
+            old_id = self._templates.pop((pair, template), None)
+            if old_id is not None:
+                self._bytes -= self._entries.pop(old_id)[5]
+                self._evicted += 1
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (pair, template, values, translation, grams, size)
+            self._templates[(pair, template)] = entry_id
+            self._bytes += size
+            postings = self._postings[pair]
+            for gram in grams:
+                postings[gram].append(entry_id)
+
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (old_pair, old_template, *_rest, old_size) = self._entries.popitem(last=False)
+                self._templates.pop((old_pair, old_template), None)
+                self._bytes -= old_size
+                self._evicted += 1
+
+            # Posting lists keep stale ids of replaced and evicted entries; sweep once they
+            # outnumber the live ones so the cost is amortised over the adds that caused them
+            if self._evicted > len(self._entries) + 1024:
+                self._prune()
+
+    def _prune(self):
+        for postings in self._postings.values():
+            for gram in list(postings):
+                live = array('Q', (i for i in postings[gram] if i in self._entries))
+                if live:
+                    postings[gram] = live
+                else:
+                    del postings[gram]
+        self._evicted = 0
+
+    def lookup(self, text, source, target):
+        """Return a reusable translation for text, or None when nothing is similar enough"""
+        pair = (source, target)
+        template, values = mask_variables(text)
+
+        with self._lock:
+            entry_id = self._templates.get((pair, template))
+            if entry_id is not None:
+                entry = self._entries[entry_id]
+                result = _substitute(entry[3], entry[2], values)
+                if result is not None:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return result
+
+            if self.min_similarity < 1.0:
+                for score, entry_id in self._candidates(pair, template):
+                    entry = self._entries[entry_id]
+                    result = _substitute(entry[3], entry[2], values)
+                    if result is not None:
+                        self._entries.move_to_end(entry_id)
+                        self.fuzzy_hits += 1
+                        return result
+
+            self.misses += 1
+            return None
+
+    def _candidates(self, pair, template):
+        """Return (similarity, id) of indexed templates above min_similarity, best first"""
+        postings = self._postings.get(pair)
+        if not postings:
+            return []
+
+        grams = set(_ngrams(template, self.ngram))
+        # Any entry with Jaccard >= t shares at least one of any (|q| - ceil(t*|q|) + 1) grams
+        # of the query, so probing only the rarest grams cannot miss a match.
+        required = len(grams) - int(self.min_similarity * len(grams) + 0.999999) + 1
+        probe = sorted(grams, key=lambda g: len(postings.get(g, ())))[:max(required, 1)]
+
+        candidates = set()
+        for gram in probe:
+            # Newest entries first; evicted ids are skipped here and pruned on the next eviction sweep
+            for entry_id in reversed(postings.get(gram, ())):
+                if entry_id in self._entries:
+                    candidates.add(entry_id)
+                    if len(candidates) >= self.max_candidates:
+                        break
+            if len(candidates) >= self.max_candidates:
+                break
+
+        # Jaccard >= t also needs t <= |other| / |query| <= 1 / t, which skips most candidates cheaply
+        shortest = self.min_similarity * len(grams)
+        longest = len(grams) / self.min_similarity if self.min_similarity > 0 else float('inf')
+        scored = []
+        for entry_id in candidates:
+            other = self._entries[entry_id][4]
+            if not shortest <= len(other) <= longest:
+                continue
+            common = len(grams.intersection(other))
+            score = common / (len(grams) + len(other) - common)
+            if score >= self.min_similarity:
+                scored.append((score, entry_id))
+        scored.sort(reverse=True)
+        return scored
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'fuzzy_hits': self.fuzzy_hits,
+            'misses': self.misses,
+        }